@@ -1,10 +1,21 @@
 import time
+STARTUP_T0 = time.perf_counter()  # before the heavy imports below (startup trace)
+
+import argparse
+import contextlib
+import sys
 import json
 import os
 import random
+import shutil
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import cv2
 import numpy as np
-from mss import mss
+# mss (real screen) and report (batch summary) are imported where needed: the simulator doesn't use mss
+
+IMPORTS_DONE = time.perf_counter()
 
 # --- DPI adjustment (Windows) so coordinates match the screen ---
 try:
@@ -23,6 +34,8 @@ DEFAULT_STATE_PAUSE_RANGE = (1.0, 1.5)
 DEFAULT_P_INTERVAL_RANGE = (0.9, 1.3)
 DEFAULT_P_DURATION_SECONDS = 19.5
 DEFAULT_STATE_TIMEOUT_SECONDS = 5.0
+DEFAULT_P_END_ON_COLLECT = True   # end P_RUN as soon as the collect button shows up
+DEFAULT_P_SETTLE_SECONDS = 5.0    # ... or once no slot lit up for this long after the first hit (0 = off)
 
 MIN_SCAN_INTERVAL = 0.08
 
@@ -42,12 +55,52 @@ DEFAULT_DARK_TOL = 0.18
 DEFAULT_BG_BORDER = 4
 DEFAULT_BG_MAX_MEAN = 70
 DEFAULT_TOPK_TRIES = 6
-
-
-def load_config():
-    if not os.path.exists(CONFIG_FILE):
-        raise RuntimeError(f"Configuration file not found: {CONFIG_FILE}")
-    with open(CONFIG_FILE, "r", encoding="utf-8") as f:
+DEFAULT_PEAK_MIN_SCORE = 0.30  # default candidate floor when a caller has no threshold of its own
+PEAK_SORT_MAX_SHARE = 1 / 64   # above this share of the response map passing the floor, rescan instead of sorting
+
+# Brightness-profile prefilter (skips matchTemplate when no window can pass candidate_ok)
+DEFAULT_PREFILTER_STRIDE = 2
+DEFAULT_PREFILTER_AUDIT_RATE = 0.05  # share of rejects still fully matched to measure false rejects
+
+# Debug window (rendered on its own thread)
+DEFAULT_DEBUG_MAX_FPS = 10.0
+DEFAULT_DEBUG_RENDER_WIDTH = 1100
+
+# Flight recorder (config.json -> recorder)
+DEFAULT_RECORDER_SECONDS = 20.0
+DEFAULT_RECORDER_FPS = 4.0
+DEFAULT_RECORDER_SCALE = 0.5
+DEFAULT_RECORDER_JPEG_QUALITY = 70
+DEFAULT_RECORDER_MAX_MB = 48.0
+DEFAULT_RECORDER_DUMP_DIR = "flight_dumps"
+DEFAULT_RECORDER_MAX_DUMPS = 50
+DEFAULT_DUMP_KEY = "F9"
+
+# Hotkey listener thread
+DEFAULT_HOTKEY_POLL_MS = 5
+
+# Structured event log (JSONL) consumed by report.py
+DEFAULT_EVENTS_FILE = "events.jsonl"
+
+# Batch mode (--batch): no verified button click for this long = stalled (exit code EXIT_STALLED)
+DEFAULT_BATCH_STALL_SECONDS = 120.0
+EXIT_STALLED = 3
+
+# Adaptive per-state timeouts, learned from how long each button takes to appear
+DEFAULT_TIMEOUTS_FILE = "state_timeouts.json"
+DEFAULT_TIMEOUT_PERCENTILE = 0.95
+DEFAULT_TIMEOUT_MARGIN = 1.5        # timeout = percentile latency * margin, clamped to [min, max]
+DEFAULT_TIMEOUT_MIN_SECONDS = 2.0
+DEFAULT_TIMEOUT_MAX_SECONDS = 15.0
+DEFAULT_TIMEOUT_WINDOW = 50         # latencies kept per state
+DEFAULT_TIMEOUT_MIN_SAMPLES = 8     # below this, state_timeout_seconds is used
+DEFAULT_TIMEOUT_RECOVER_VISITS = 5  # after a timeout, the learned value can't go below the global one for this many visits
+
+
+def load_config(path=CONFIG_FILE):
+    if not os.path.exists(path):
+        raise RuntimeError(f"Configuration file not found: {path}")
+    with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
 
@@ -103,12 +156,20 @@ def sendinput_click(x, y):
     _send(MOUSEINPUT(0, 0, 0, 0x0004, 0, None))            # up
 
 
-def jitter_sleep(base, jitter):
-    time.sleep(max(0.0, random.uniform(base - jitter, base + jitter)))
+def wait_or_cancel(seconds, hotkeys=None):
+    """Sleeps up to `seconds`; returns True early if a start/stop/quit hotkey is pending."""
+    if hotkeys is None:
+        time.sleep(max(0.0, seconds))
+        return False
+    return hotkeys.wait(max(0.0, seconds))
+
 
+def jitter_sleep(base, jitter, hotkeys=None):
+    return wait_or_cancel(random.uniform(base - jitter, base + jitter), hotkeys)
 
-def short_pause(rng):
-    time.sleep(random.uniform(rng[0], rng[1]))
+
+def short_pause(rng, hotkeys=None):
+    return wait_or_cancel(random.uniform(rng[0], rng[1]), hotkeys)
 
 
 def pick_monitor_rect(sct, monitor_index):
@@ -120,12 +181,11 @@ def pick_monitor_rect(sct, monitor_index):
     return int(mon["left"]), int(mon["top"]), int(mon["width"]), int(mon["height"])
 
 
-def move_debug_window(window_name, sct, window_monitor_index):
+def debug_window_pos(sct, window_monitor_index):
     if window_monitor_index < len(sct.monitors):
         mon = sct.monitors[window_monitor_index]
-        cv2.moveWindow(window_name, int(mon["left"]) + 50, int(mon["top"]) + 50)
-    else:
-        cv2.moveWindow(window_name, 50, 50)
+        return int(mon["left"]) + 50, int(mon["top"]) + 50
+    return 50, 50
 
 
 def load_points_file(points_file):
@@ -211,20 +271,32 @@ def _has_separated_points(pts, min_count, min_sep):
     return False
 
 
-def color_hit(crop_bgr, config):
+def color_hit(crop_bgr, config, pool=None):
     det = config["detection"]
     color_1 = det["color_1"]
     color_2 = det["color_2"]
 
     c1 = np.array([color_1[2], color_1[1], color_1[0]], dtype=np.int16)
     c2 = np.array([color_2[2], color_2[1], color_2[0]], dtype=np.int16)
-    img = crop_bgr.astype(np.int16)
-
-    d1 = np.abs(img - c1).sum(axis=2)
-    d2 = np.abs(img - c2).sum(axis=2)
     thresh = det["color_tol"] * 3
-    mask1 = d1 <= thresh
-    mask2 = d2 <= thresh
+
+    if pool is None:
+        img = crop_bgr.astype(np.int16)
+        d1 = np.abs(img - c1).sum(axis=2)
+        d2 = np.abs(img - c2).sum(axis=2)
+        mask1 = d1 <= thresh
+        mask2 = d2 <= thresh
+    else:
+        hw = crop_bgr.shape[:2]
+        diff = pool.view("color_diff", crop_bgr.shape, np.int16)
+        dist = pool.view("color_dist", hw, np.int16)
+        mask1 = pool.view("color_mask1", hw, np.bool_)
+        mask2 = pool.view("color_mask2", hw, np.bool_)
+        for c, mask in ((c1, mask1), (c2, mask2)):
+            np.subtract(crop_bgr, c, out=diff)
+            np.abs(diff, out=diff)
+            np.sum(diff, axis=2, out=dist)
+            np.less_equal(dist, thresh, out=mask)
 
     pts1 = np.column_stack(np.where(mask1))
     pts2 = np.column_stack(np.where(mask2))
@@ -240,6 +312,74 @@ def color_hit(crop_bgr, config):
     return (ok1 and ok2 and ok_ratio), (c1_count, c2_count)
 
 
+def slot_color_counts(crop_bgr, det_config):
+    """Pixels of each colour inside the per-channel box [colour - tol*3, colour + tol*3] (BGR crop)."""
+    thresh = det_config["color_tol"] * 3
+    counts = []
+    for key in ("color_1", "color_2"):
+        r, g, b = det_config[key]
+        lo = (max(0, b - thresh), max(0, g - thresh), max(0, r - thresh))
+        hi = (min(255, b + thresh), min(255, g + thresh), min(255, r + thresh))
+        counts.append(cv2.countNonZero(cv2.inRange(crop_bgr, lo, hi)))
+    return counts
+
+
+def slot_maybe_lit(crop_bgr, det_config, baseline=None):
+    """
+    Cheap gate before color_hit: both colour counts must exceed the slot's empty baseline by
+    color_min_count. Without a baseline this is an absolute floor (the box contains every pixel
+    color_hit's summed distance accepts, so it never rejects a slot color_hit would accept).
+    """
+    min_count = det_config["color_min_count"]
+    base = baseline or (0, 0)
+    return all(n - b >= min_count for n, b in zip(slot_color_counts(crop_bgr, det_config), base))
+
+
+def compute_slot_baselines(frame_bgr, mon_left, mon_top, left_points, right_points, det_config):
+    """
+    Empty-state colour counts per slot (recorded by capture_points.py into points.json).
+    A slot that is out of frame or already looks lit gets None (it only gets the absolute floor).
+    """
+    box = int(det_config["color_box"])
+    half = box // 2
+    H, W = frame_bgr.shape[:2]
+
+    def one(x, y):
+        x, y = int(x - mon_left), int(y - mon_top)
+        if x - half < 0 or y - half < 0 or x + half > W or y + half > H:
+            return None
+        crop = frame_bgr[y - half:y + half, x - half:x + half]
+        if slot_maybe_lit(crop, det_config):
+            return None
+        return slot_color_counts(crop, det_config)
+
+    return {
+        "box": box,
+        "color_tol": det_config["color_tol"],
+        "color_1": list(det_config["color_1"]),
+        "color_2": list(det_config["color_2"]),
+        "left": [one(x, y) for (x, y) in left_points],
+        "right": [one(x, y) for (x, y) in right_points],
+    }
+
+
+def load_slot_baselines(points_file, n_left, n_right, det_config):
+    """Per-slot [n_color_1, n_color_2] or None, aligned with left_points + right_points; None when unusable."""
+    with open(points_file, "r", encoding="utf-8") as f:
+        bl = json.load(f).get("slot_baselines")
+    if not isinstance(bl, dict) or "color_tol" not in bl:
+        return None
+    if (bl.get("box"), bl.get("color_tol"), bl.get("color_1"), bl.get("color_2")) != (
+            det_config["color_box"], det_config["color_tol"], list(det_config["color_1"]), list(det_config["color_2"])):
+        print("[points] slot baselines were recorded with other color_box/color_tol/colours; ignoring them.")
+        return None
+    left = bl.get("left") or []
+    right = bl.get("right") or []
+    if len(left) != n_left or len(right) != n_right:
+        return None
+    return [tuple(b) if b is not None else None for b in left + right]
+
+
 def grab_frame(sct, monitor):
     img = np.array(sct.grab(monitor))
     frame_bgr = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
@@ -248,7 +388,7 @@ def grab_frame(sct, monitor):
 
 
 def load_icon_template(path, mask_mode="auto", white_cutoff=255,
-                       bright_thr=DEFAULT_BRIGHT_THR, dark_thr=DEFAULT_DARK_THR):
+                       bright_thr=DEFAULT_BRIGHT_THR, dark_thr=DEFAULT_DARK_THR, name=None):
     if not os.path.exists(path):
         raise RuntimeError(f"Icon template not found: {path}")
 
@@ -308,15 +448,25 @@ def load_icon_template(path, mask_mode="auto", white_cutoff=255,
     has_black_bg = dark_frac >= 0.30
 
     h, w = gray.shape[:2]
+    valid_px = alpha_bool if coverage < 0.999 else np.ones((h, w), dtype=bool)  # pixels candidate_ok looks at
+    mys, mxs = np.nonzero(valid_px)
+    if mys.size == 0:
+        mask_bbox = (0, 0, int(w), int(h))
+    else:
+        mask_bbox = (int(mxs.min()), int(mys.min()), int(mxs.max() - mxs.min() + 1), int(mys.max() - mys.min() + 1))
     return {
         "path": path,
+        "name": name or os.path.basename(path),
         "gray": gray,
         "mask": mask,
         "use_mask": use_mask,
         "method": method,
         "w": int(w),
         "h": int(h),
-        "alpha_bool": alpha_bool if coverage < 0.999 else np.ones((h, w), dtype=bool),
+        "alpha_bool": valid_px,
+        "opaque": coverage >= 0.999,
+        "mask_bbox": mask_bbox,  # (x, y, w, h) of the alpha mask inside the template
+        "mask_px": int(valid_px.sum()),
         "bright_frac": bright_frac,
         "dark_frac": dark_frac,
         "has_black_bg": has_black_bg,
@@ -325,20 +475,111 @@ def load_icon_template(path, mask_mode="auto", white_cutoff=255,
     }
 
 
-def candidate_ok(frame_gray, x, y, templ, bright_tol, dark_tol, bg_border, bg_max_mean):
+def frame_integrals(frame_gray, bright_thr, dark_thr, out=None):
+    """
+    Per-frame integral images (bright-pixel count, dark-pixel count, intensity sum),
+    so candidate_ok can get region stats in O(1) per candidate.
+    `out` (from BufferPool) holds preallocated arrays to write into.
+    """
+    if out is None:
+        _t, bright = cv2.threshold(frame_gray, bright_thr - 1, 1, cv2.THRESH_BINARY)
+        _t, dark = cv2.threshold(frame_gray, dark_thr, 1, cv2.THRESH_BINARY_INV)
+        return {
+            "bright_thr": bright_thr,
+            "dark_thr": dark_thr,
+            "bright": cv2.integral(bright),
+            "dark": cv2.integral(dark),
+            "sum": cv2.integral(frame_gray),
+        }
+
+    cv2.threshold(frame_gray, bright_thr - 1, 1, cv2.THRESH_BINARY, dst=out["bright_mask"])
+    cv2.threshold(frame_gray, dark_thr, 1, cv2.THRESH_BINARY_INV, dst=out["dark_mask"])
+    cv2.integral(out["bright_mask"], sum=out["bright"])
+    cv2.integral(out["dark_mask"], sum=out["dark"])
+    cv2.integral(frame_gray, sum=out["sum"])
+    out["bright_thr"] = bright_thr
+    out["dark_thr"] = dark_thr
+    return out
+
+
+class BufferPool:
+    """Preallocated frame/scratch buffers for the per-frame hot path (main loop only, not thread-safe)."""
+
+    def __init__(self, width, height):
+        self.W, self.H = int(width), int(height)
+        self.frames = {}   # slot -> {"bgr", "gray", "ii"}
+        self.scratch = {}  # name -> flat array
+
+    def grab(self, sct, monitor, slot="scan"):
+        f = self.frames.get(slot)
+        if f is None:
+            H, W = self.H, self.W
+            f = self.frames[slot] = {
+                "bgr": np.empty((H, W, 3), dtype=np.uint8),
+                "gray": np.empty((H, W), dtype=np.uint8),
+                "ii": {
+                    "bright_mask": np.empty((H, W), dtype=np.uint8),
+                    "dark_mask": np.empty((H, W), dtype=np.uint8),
+                    "bright": np.empty((H + 1, W + 1), dtype=np.int32),
+                    "dark": np.empty((H + 1, W + 1), dtype=np.int32),
+                    "sum": np.empty((H + 1, W + 1), dtype=np.int32),
+                },
+            }
+        img = np.asarray(sct.grab(monitor))  # view on the screenshot buffer, no copy
+        cv2.cvtColor(img, cv2.COLOR_BGRA2BGR, dst=f["bgr"])
+        cv2.cvtColor(f["bgr"], cv2.COLOR_BGR2GRAY, dst=f["gray"])
+        f["ii_key"] = None  # integrals are stale
+        return f["bgr"], f["gray"]
+
+    def integrals(self, frame_gray, bright_thr, dark_thr):
+        """frame_integrals for a frame grabbed into this pool (computed once per grab); other frames fall back."""
+        for f in self.frames.values():
+            if f["gray"] is frame_gray:
+                if f["ii_key"] != (bright_thr, dark_thr):
+                    frame_integrals(frame_gray, bright_thr, dark_thr, out=f["ii"])
+                    f["ii_key"] = (bright_thr, dark_thr)
+                return f["ii"]
+        return frame_integrals(frame_gray, bright_thr, dark_thr)
+
+    def view(self, name, shape, dtype):
+        n = int(np.prod(shape))
+        buf = self.scratch.get(name)
+        if buf is None or buf.dtype != dtype or buf.size < n:
+            buf = self.scratch[name] = np.empty(n, dtype=dtype)
+        return buf[:n].reshape(shape)
+
+
+def _rect_sum(ii, x1, y1, x2, y2):
+    return int(ii[y2, x2]) - int(ii[y1, x2]) - int(ii[y2, x1]) + int(ii[y1, x1])
+
+
+def candidate_ok(frame_gray, x, y, templ, bright_tol, dark_tol, bg_border, bg_max_mean, integrals=None):
     h, w = templ["h"], templ["w"]
     H, W = frame_gray.shape[:2]
     if x < 0 or y < 0 or x + w > W or y + h > H:
         return False, "oob"
 
-    crop = frame_gray[y:y+h, x:x+w]
-    m = templ["alpha_bool"]
-    pix = crop[m]
-    if pix.size < 50:
-        return False, "pix_low"
+    use_ii = (
+        integrals is not None
+        and integrals["bright_thr"] == templ["bright_thr"]
+        and integrals["dark_thr"] == templ["dark_thr"]
+    )
+
+    if use_ii and templ["opaque"]:
+        n = w * h
+        if n < 50:
+            return False, "pix_low"
+        b = _rect_sum(integrals["bright"], x, y, x + w, y + h) / n
+        d = _rect_sum(integrals["dark"], x, y, x + w, y + h) / n
+    else:
+        crop = frame_gray[y:y+h, x:x+w]
+        m = templ["alpha_bool"]
+        pix = crop[m]
+        if pix.size < 50:
+            return False, "pix_low"
 
-    b = float(np.mean(pix >= templ["bright_thr"]))
-    d = float(np.mean(pix <= templ["dark_thr"]))
+        b = float(np.mean(pix >= templ["bright_thr"]))
+        d = float(np.mean(pix <= templ["dark_thr"]))
 
     if abs(b - templ["bright_frac"]) > bright_tol:
         return False, f"bright_off({b:.2f}/{templ['bright_frac']:.2f})"
@@ -351,68 +592,305 @@ def candidate_ok(frame_gray, x, y, templ, bright_tol, dark_tol, bg_border, bg_ma
         xb2 = min(W, x + w + bg_border)
         yb2 = min(H, y + h + bg_border)
 
-        region = frame_gray[yb1:yb2, xb1:xb2]
-        mask = np.ones(region.shape, dtype=bool)
-        ix1 = y - yb1
-        iy1 = x - xb1
-        ix2 = ix1 + h
-        iy2 = iy1 + w
-        mask[ix1:ix2, iy1:iy2] = False
-        outside = region[mask]
-        if outside.size > 0 and float(outside.mean()) > bg_max_mean:
-            return False, f"bg_mean({outside.mean():.1f})"
+        if integrals is not None:
+            # bordered rect minus the candidate rect
+            n_out = (xb2 - xb1) * (yb2 - yb1) - w * h
+            if n_out > 0:
+                s_out = _rect_sum(integrals["sum"], xb1, yb1, xb2, yb2) - _rect_sum(integrals["sum"], x, y, x + w, y + h)
+                out_mean = s_out / n_out
+                if out_mean > bg_max_mean:
+                    return False, f"bg_mean({out_mean:.1f})"
+        else:
+            region = frame_gray[yb1:yb2, xb1:xb2]
+            mask = np.ones(region.shape, dtype=bool)
+            ix1 = y - yb1
+            iy1 = x - xb1
+            ix2 = ix1 + h
+            iy2 = iy1 + w
+            mask[ix1:ix2, iy1:iy2] = False
+            outside = region[mask]
+            if outside.size > 0 and float(outside.mean()) > bg_max_mean:
+                return False, f"bg_mean({outside.mean():.1f})"
 
     return True, "ok"
 
 
-def match_best_valid(frame_gray, templ, topk, bright_tol, dark_tol, bg_border, bg_max_mean):
+def extract_peaks(res, w, h, higher_is_better, min_score=DEFAULT_PEAK_MIN_SCORE, topk=DEFAULT_TOPK_TRIES, pool=None):
+    """
+    Up to `topk` response peaks scoring >= min_score, best first, at least half a template apart
+    (a flat plateau yields one peak). Returns (scores, xs, ys); scores are "higher is better" for both
+    methods. Few pixels above the floor: sort them and suppress greedily; many: rescan with minMaxLoc.
+    `res` is not modified.
+    """
+    hw, hh = w // 2, h // 2
+    thr = min_score if higher_is_better else 1.0 - min_score
+    cmp = cv2.CMP_GE if higher_is_better else cv2.CMP_LE
+    above = cv2.compare(res, thr, cmp, dst=pool.view("peaks_thr", res.shape, np.uint8) if pool is not None else None)
+    n = cv2.countNonZero(above)
+    if n == 0:
+        return np.empty(0, np.float32), np.empty(0, np.int64), np.empty(0, np.int64)
+
+    if n <= res.size * PEAK_SORT_MAX_SHARE:
+        pts = cv2.findNonZero(above).reshape(-1, 2)
+        xs, ys = pts[:, 0], pts[:, 1]
+        vals = res[ys, xs]
+        order = np.argsort(-vals if higher_is_better else vals, kind="stable")
+        xs, ys, vals = xs[order], ys[order], vals[order]
+        alive = np.ones(xs.size, dtype=np.bool_)
+        keep = []
+        while len(keep) < topk:
+            i = int(np.argmax(alive))
+            if not alive[i]:
+                break
+            keep.append(i)
+            alive &= (np.abs(xs - xs[i]) > hw) | (np.abs(ys - ys[i]) > hh)
+        xs, ys, vals = xs[keep].astype(np.int64), ys[keep].astype(np.int64), vals[keep]
+        return (vals if higher_is_better else 1.0 - vals), xs, ys
+
+    # large areas above the floor (flat bright patches): topk suppress-and-rescan passes are cheaper
+    work = pool.view("peaks_work", res.shape, np.float32) if pool is not None else np.empty_like(res)
+    np.copyto(work, res)
+    fill = -1.0 if higher_is_better else 1.0
+    scores, xs, ys = [], [], []
+    for _ in range(topk):
+        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(work)
+        val, (x, y) = (max_val, max_loc) if higher_is_better else (min_val, min_loc)
+        score = val if higher_is_better else 1.0 - val
+        if score < min_score:
+            break
+        scores.append(score)
+        xs.append(x)
+        ys.append(y)
+        work[max(0, y - hh):y + hh + 1, max(0, x - hw):x + hw + 1] = fill
+    return np.array(scores, np.float32), np.array(xs, np.int64), np.array(ys, np.int64)
+
+
+def prefilter_region(frame_shape, integrals, templ, bright_tol, dark_tol, stride=DEFAULT_PREFILTER_STRIDE, pool=None):
+    """
+    Cheap "where could the icon be" test from the frame integrals. Returns the inclusive range of
+    top-left positions (x1, y1, x2, y2) whose window could pass candidate_ok's bright/dark check,
+    or None if no position can (= icon absent, skip matchTemplate).
+
+    Conservative by construction: counts are taken over the mask's bounding box (bw*bh pixels, m of
+    them in the mask), so a box may hold up to bw*bh-m extra hits, and a position between two sampled
+    ones differs from the sampled one by at most (stride-1)*(bw+bh) pixels.
+    """
+    H, W = frame_shape[:2]
+    bx, by, bw, bh = templ["mask_bbox"]
+    nx = W - templ["w"] + 1
+    ny = H - templ["h"] + 1
+    m = templ["mask_px"]
+    slack = (stride - 1) * (bw + bh)
+
+    ok = None
+    for key, frac, tol in (("bright", templ["bright_frac"], bright_tol), ("dark", templ["dark_frac"], dark_tol)):
+        lo = (frac - tol) * m - slack
+        hi = (frac + tol) * m + (bw * bh - m) + slack
+        if lo <= 0 and hi >= bw * bh:
+            continue  # no constraint
+        ii = integrals[key]
+        a = ii[by:by + ny:stride, bx:bx + nx:stride]
+        b = ii[by:by + ny:stride, bx + bw:bx + bw + nx:stride]
+        c = ii[by + bh:by + bh + ny:stride, bx:bx + nx:stride]
+        d = ii[by + bh:by + bh + ny:stride, bx + bw:bx + bw + nx:stride]
+        if pool is None:
+            counts = d - b - c + a
+            passed = (counts >= lo) & (counts <= hi)
+            ok = passed if ok is None else (ok & passed)
+        else:
+            counts = pool.view("pf_counts", a.shape, np.int32)
+            passed = pool.view("pf_" + key, a.shape, np.bool_)
+            above = pool.view("pf_lo", a.shape, np.bool_)
+            np.subtract(d, b, out=counts)
+            np.subtract(counts, c, out=counts)
+            np.add(counts, a, out=counts)
+            np.greater_equal(counts, lo, out=above)
+            np.less_equal(counts, hi, out=passed)
+            np.logical_and(passed, above, out=passed)
+            if ok is not None:
+                np.logical_and(ok, passed, out=passed)
+            ok = passed
+
+    if ok is None:
+        return 0, 0, nx - 1, ny - 1
+    ys, xs = np.nonzero(ok)
+    if ys.size == 0:
+        return None
+    return (int(xs.min()) * stride, int(ys.min()) * stride,
+            min(nx - 1, int(xs.max()) * stride + stride - 1), min(ny - 1, int(ys.max()) * stride + stride - 1))
+
+
+class MatchPrefilter:
+    """
+    Runs prefilter_region before matchTemplate and keeps per-template counts.
+
+    Frames where the icon can't be are rejected; otherwise matchTemplate only runs over the region
+    that can still hold it. A share of rejects (`audit_rate`) is matched in full anyway: a valid match
+    there is a false reject, so report.py can show whether stride/tolerances are safe to keep.
+    """
+
+    def __init__(self, stride=DEFAULT_PREFILTER_STRIDE, audit_rate=DEFAULT_PREFILTER_AUDIT_RATE):
+        self.stride = max(1, int(stride))
+        self.audit_rate = float(audit_rate)
+        self.stats = {}  # template name -> {"checks", "rejects", "audits", "false_rejects", "searched"}
+
+    def check(self, frame_shape, integrals, templ, bright_tol, dark_tol, pool=None):
+        """
+        Returns (verdict, region): "pass" with the region to search, "reject", or "audit"
+        (rejected, but match the full frame anyway and call record_audit).
+        """
+        st = self.stats.setdefault(templ["name"],
+                                   {"checks": 0, "rejects": 0, "audits": 0, "false_rejects": 0, "searched": 0.0})
+        st["checks"] += 1
+        region = prefilter_region(frame_shape, integrals, templ, bright_tol, dark_tol, self.stride, pool)
+        if region is not None:
+            x1, y1, x2, y2 = region
+            st["searched"] += (x2 - x1 + 1) * (y2 - y1 + 1) / ((frame_shape[1] - templ["w"] + 1) * (frame_shape[0] - templ["h"] + 1))
+            return "pass", region
+        st["rejects"] += 1
+        if random.random() < self.audit_rate:
+            st["audits"] += 1
+            return "audit", None
+        return "reject", None
+
+    def record_audit(self, templ, valid):
+        if valid:
+            self.stats[templ["name"]]["false_rejects"] += 1
+
+    def report(self):
+        return {name: {**st, "searched": round(st["searched"], 3)} for name, st in self.stats.items()}
+
+
+def match_best_valid(frame_gray, templ, topk, bright_tol, dark_tol, bg_border, bg_max_mean, integrals=None, prefilter=None,
+                     pool=None, min_score=DEFAULT_PEAK_MIN_SCORE):
     H, W = frame_gray.shape[:2]
     h, w = templ["h"], templ["w"]
     if h >= H or w >= W:
         return 0.0, (0, 0), False, "templ_gt_frame"
 
-    if templ["method"] == "ccoeff":
-        res = cv2.matchTemplate(frame_gray, templ["gray"], cv2.TM_CCOEFF_NORMED)
-        fill = -1.0
-        best_score, best_loc, best_reason = 0.0, (0, 0), "no_try"
-        for _ in range(topk):
-            _min, max_val, _min_loc, max_loc = cv2.minMaxLoc(res)
-            score = float(max_val)
-            x, y = max_loc
-            if score > best_score:
-                best_score, best_loc = score, (x, y)
-            ok, reason = candidate_ok(frame_gray, x, y, templ, bright_tol, dark_tol, bg_border, bg_max_mean)
-            if ok:
-                return score, (x, y), True, "ok"
-            best_reason = reason
-            x2 = min(res.shape[1], x + w)
-            y2 = min(res.shape[0], y + h)
-            res[y:y2, x:x2] = fill
-        return best_score, best_loc, False, best_reason
-
-    # SQDIFF (masked when available)
-    if templ["use_mask"] and templ["mask"] is not None:
-        res = cv2.matchTemplate(frame_gray, templ["gray"], cv2.TM_SQDIFF_NORMED, mask=templ["mask"])
+    # integrals only pay off for the prefilter and the O(1) paths of candidate_ok (opaque / black-background templates)
+    needs_ii = prefilter is not None or templ["opaque"] or templ["has_black_bg"]
+    if integrals is not None and (integrals["bright_thr"] != templ["bright_thr"] or integrals["dark_thr"] != templ["dark_thr"]):
+        integrals = None
+    if integrals is None and needs_ii:
+        if pool is not None:
+            integrals = pool.integrals(frame_gray, templ["bright_thr"], templ["dark_thr"])
+        else:
+            integrals = frame_integrals(frame_gray, templ["bright_thr"], templ["dark_thr"])
+
+    verdict, region = "pass", None
+    if prefilter is not None:
+        verdict, region = prefilter.check(frame_gray.shape, integrals, templ, bright_tol, dark_tol, pool)
+        if verdict == "reject":
+            return 0.0, (0, 0), False, "prefilter"
+
+    # search area: top-left positions x1..x2 / y1..y2 -> frame crop including the template extent
+    x1, y1, x2, y2 = region if region is not None else (0, 0, W - w, H - h)
+    search = frame_gray[y1:y2 + h, x1:x2 + w]
+
+    res = None
+    if pool is not None:
+        res = pool.view("response", (y2 - y1 + 1, x2 - x1 + 1), np.float32)
+
+    higher_is_better = templ["method"] == "ccoeff"
+    if higher_is_better:
+        res = cv2.matchTemplate(search, templ["gray"], cv2.TM_CCOEFF_NORMED, result=res)
+    elif templ["use_mask"] and templ["mask"] is not None:
+        # SQDIFF (masked when available)
+        res = cv2.matchTemplate(search, templ["gray"], cv2.TM_SQDIFF_NORMED, result=res, mask=templ["mask"])
     else:
-        res = cv2.matchTemplate(frame_gray, templ["gray"], cv2.TM_SQDIFF_NORMED)
+        res = cv2.matchTemplate(search, templ["gray"], cv2.TM_SQDIFF_NORMED, result=res)
 
-    fill = 1.0
-    best_score, best_loc, best_reason = 0.0, (0, 0), "no_try"
-    for _ in range(topk):
-        min_val, _max, min_loc, _max_loc = cv2.minMaxLoc(res)
-        score = 1.0 - float(min_val)
-        x, y = min_loc
-        if score > best_score:
-            best_score, best_loc = score, (x, y)
-        ok, reason = candidate_ok(frame_gray, x, y, templ, bright_tol, dark_tol, bg_border, bg_max_mean)
+    result = _best_valid_peak(frame_gray, res, x1, y1, templ, topk, bright_tol, dark_tol, bg_border, bg_max_mean, integrals,
+                              pool, min_score)
+    if verdict == "audit":
+        prefilter.record_audit(templ, result[2])
+    return result
+
+
+def _best_valid_peak(frame_gray, res, ox, oy, templ, topk, bright_tol, dark_tol, bg_border, bg_max_mean, integrals,
+                     pool=None, min_score=DEFAULT_PEAK_MIN_SCORE):
+    """Validates the response peaks best-first; (ox, oy) = frame position of res[0, 0]."""
+    h, w = templ["h"], templ["w"]
+    higher_is_better = templ["method"] == "ccoeff"
+
+    scores, xs, ys = extract_peaks(res, w, h, higher_is_better, min_score, topk, pool)
+    if scores.size == 0:
+        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(res)
+        if higher_is_better:
+            return float(max_val), (max_loc[0] + ox, max_loc[1] + oy), False, "low_score"
+        return 1.0 - float(min_val), (min_loc[0] + ox, min_loc[1] + oy), False, "low_score"
+
+    # candidates are validated lazily, best score first
+    best_reason = "no_try"
+    for i in range(min(topk, scores.size)):
+        x, y = int(xs[i]) + ox, int(ys[i]) + oy
+        ok, reason = candidate_ok(frame_gray, x, y, templ, bright_tol, dark_tol, bg_border, bg_max_mean, integrals)
         if ok:
-            return score, (x, y), True, "ok"
+            return float(scores[i]), (x, y), True, "ok"
         best_reason = reason
-        x2 = min(res.shape[1], x + w)
-        y2 = min(res.shape[0], y + h)
-        res[y:y2, x:x2] = fill
 
-    return best_score, best_loc, False, best_reason
+    return float(scores[0]), (int(xs[0]) + ox, int(ys[0]) + oy), False, best_reason
+
+
+def load_icon_variants(images_dir, base_name, **template_kwargs):
+    """
+    All templates for one button: `<images_dir>/<base_name>.png` (if present) followed by every
+    PNG in `<images_dir>/<base_name>/` (hover state, event themes, other languages...).
+    """
+    variants = []
+    single = os.path.join(images_dir, base_name + ".png")
+    if os.path.exists(single):
+        variants.append(load_icon_template(single, **template_kwargs))
+
+    variant_dir = os.path.join(images_dir, base_name)
+    if os.path.isdir(variant_dir):
+        for fn in sorted(os.listdir(variant_dir)):
+            if fn.lower().endswith(".png"):
+                variants.append(load_icon_template(os.path.join(variant_dir, fn), name=f"{base_name}/{fn}", **template_kwargs))
+
+    if not variants:
+        raise RuntimeError(f"Icon template not found: {single} (or PNGs in {variant_dir})")
+    return TemplateVariants(base_name, variants)
+
+
+class TemplateVariants:
+    """
+    One button as a list of template variants, matched most-recently-successful first.
+
+    match() stops at the first variant with a valid hit >= thr and moves it to the front, so the
+    common case costs one template. Per-variant tries/hits are kept for report.py.
+    """
+
+    def __init__(self, name, variants):
+        self.name = name
+        self.variants = list(variants)
+        self.stats = {t["name"]: {"tries": 0, "hits": 0} for t in self.variants}
+
+    def match(self, frame_gray, thr, topk, bright_tol, dark_tol, bg_border, bg_max_mean,
+              integrals=None, prefilter=None, pool=None, record=True):
+        """Returns (score, loc, valid, reason, templ): the first hit >= thr, else the best result seen."""
+        order = self.variants
+        best = None
+        for i, templ in enumerate(order):
+            # peaks below thr can't be a hit, so thr is also the candidate floor
+            score, loc, valid, reason = match_best_valid(frame_gray, templ, topk, bright_tol, dark_tol, bg_border,
+                                                         bg_max_mean, integrals=integrals, prefilter=prefilter, pool=pool,
+                                                         min_score=thr)
+            if record:
+                self.stats[templ["name"]]["tries"] += 1
+            if valid and score >= thr:
+                if record:
+                    self.stats[templ["name"]]["hits"] += 1
+                    if i > 0:
+                        self.variants = [templ] + order[:i] + order[i + 1:]
+                return score, loc, valid, reason, templ
+            if best is None or (valid, score) > (best[2], best[0]):
+                best = (score, loc, valid, reason, templ)
+        return best
+
+    def report(self):
+        return {name: dict(st) for name, st in self.stats.items()}
 
 
 def click_with_verification(
@@ -437,20 +915,30 @@ def click_with_verification(
     dark_tol,
     bg_border,
     bg_max_mean,
+    recorder=None,
+    hotkeys=None,
+    click=sendinput_click,
+    prefilter=None,
+    pool=None,
 ):
-    now = time.time()
-    score0, loc0, valid0, reason0 = match_best_valid(
-        frame_gray, templ_current, topk, bright_tol, dark_tol, bg_border, bg_max_mean
+    """
+    templ_current / templ_next are TemplateVariants; the click goes to the variant that matched.
+    Returns (clicked, match0, last_click_ts, note); match0 is templ_current.match() on `frame_gray`.
+    """
+    now = time.monotonic()
+    match0 = templ_current.match(
+        frame_gray, thr_click, topk, bright_tol, dark_tol, bg_border, bg_max_mean, prefilter=prefilter, pool=pool
     )
+    score0, loc0, valid0, reason0, templ0 = match0
 
     if now - last_click_ts < cooldown:
-        return False, score0, loc0, last_click_ts, "cooldown"
+        return False, match0, last_click_ts, "cooldown"
 
     if (not valid0) or score0 < thr_click:
-        return False, score0, loc0, last_click_ts, f"no_match({reason0})"
+        return False, match0, last_click_ts, f"no_match({reason0})"
 
     x0, y0 = loc0
-    w, h = templ_current["w"], templ_current["h"]
+    w, h = templ0["w"], templ0["h"]
 
     click_points = [
         (0.50, 0.55),
@@ -465,36 +953,48 @@ def click_with_verification(
         cx = monitor_left + x0 + int(w * fx) + random.randint(-2, 2)
         cy = monitor_top + y0 + int(h * fy) + random.randint(-2, 2)
 
-        sendinput_click(cx, cy)
-        jitter_sleep(click_delay, click_jitter)
-        last_click_ts = time.time()
+        click(cx, cy)
+        cancelled = jitter_sleep(click_delay, click_jitter, hotkeys)
+        last_click_ts = time.monotonic()
 
-        time.sleep(random.uniform(*verify_delay_range))
-        _fbgr, g2 = grab_frame(sct, monitor)
+        if cancelled or wait_or_cancel(random.uniform(*verify_delay_range), hotkeys):
+            return False, match0, last_click_ts, "cancelled"
+        fbgr2, g2 = pool.grab(sct, monitor, "aux") if pool is not None else grab_frame(sct, monitor)
+        if recorder is not None:
+            recorder.record(fbgr2, {"action": f"verify try={i + 1}/{retries} click=({cx},{cy})"})
 
         if confirm_mode == "gone":
-            s1, _l1, v1, _r1 = match_best_valid(g2, templ_current, topk, bright_tol, dark_tol, bg_border, bg_max_mean)
+            s1, _l1, v1, _r1, _t1 = templ_current.match(g2, thr_click * 0.55, topk, bright_tol, dark_tol, bg_border,
+                                                        bg_max_mean, prefilter=prefilter, pool=pool, record=False)
             if (not v1) or (s1 < (thr_click * 0.55)):
-                return True, score0, loc0, last_click_ts, f"gone(v={v1},s1={s1:.3f})"
+                return True, match0, last_click_ts, f"gone(v={v1},s1={s1:.3f},try={i + 1})"
 
         elif confirm_mode == "next":
             if templ_next is None:
                 raise RuntimeError("confirm_mode='next' requires templ_next")
-            sN, _lN, vN, _rN = match_best_valid(g2, templ_next, topk, bright_tol, dark_tol, bg_border, bg_max_mean)
+            sN, _lN, vN, _rN, _tN = templ_next.match(g2, thr_next, topk, bright_tol, dark_tol, bg_border, bg_max_mean,
+                                                     prefilter=prefilter, pool=pool)
             if vN and sN >= thr_next:
-                return True, score0, loc0, last_click_ts, f"next(sN={sN:.3f})"
+                return True, match0, last_click_ts, f"next(sN={sN:.3f},try={i + 1})"
         else:
             raise RuntimeError(f"Unknown confirm_mode: {confirm_mode}")
 
-    return False, score0, loc0, last_click_ts, "retries_exhausted"
+    return False, match0, last_click_ts, "retries_exhausted"
 
 
-def run_p_routine_once(frame_bgr, monitor_left, monitor_top, all_points, config, click_delay, click_jitter):
+def run_p_routine_once(frame_bgr, monitor_left, monitor_top, all_points, config, click_delay, click_jitter,
+                       slot_prefilter=True, hotkeys=None, click=sendinput_click, pool=None, baselines=None):
+    """
+    One P_RUN round. With `slot_prefilter`, slots whose colour counts didn't rise above their empty
+    baseline (or the absolute floor) are skipped before the full two-colour test (slot_maybe_lit).
+    Stops early on a pending stop hotkey. Returns (hit slot indices, skipped).
+    """
     det_config = config["detection"]
     color_box = det_config["color_box"]
 
-    matches = 0
-    for (cx, cy) in all_points:
+    hits = []
+    skipped = 0
+    for i, (cx, cy) in enumerate(all_points):
         half = color_box // 2
         rx1 = int(cx - monitor_left - half)
         ry1 = int(cy - monitor_top - half)
@@ -505,22 +1005,583 @@ def run_p_routine_once(frame_bgr, monitor_left, monitor_top, all_points, config,
             continue
 
         crop = frame_bgr[ry1:ry2, rx1:rx2]
-        hit, _ = color_hit(crop, config)
+        if slot_prefilter and not slot_maybe_lit(crop, det_config, baselines[i] if baselines else None):
+            skipped += 1
+            continue
+
+        hit, _ = color_hit(crop, config, pool)
         if hit:
-            matches += 1
-            sendinput_click(cx, cy)
-            jitter_sleep(click_delay, click_jitter)
+            hits.append(i)
+            click(cx, cy)
+            if jitter_sleep(click_delay, click_jitter, hotkeys):
+                break
 
-    return matches
+    return hits, skipped
 
 
-def main():
-    config = load_config()
+class KeyboardHotkeySource:
+    """Polls GetAsyncKeyState for the configured keys; poll() returns the event names pressed since last call."""
+
+    def __init__(self, bindings):
+        self.bindings = [(vk_from_key(key), name) for key, name in bindings]
+
+    def poll(self):
+        return [name for vk, name in self.bindings if is_key_toggled(vk)]
+
+
+class ScriptedHotkeySource:
+    """Replays [(seconds_after_start, event_name), ...] - stands in for the keyboard in headless runs/tests."""
+
+    def __init__(self, script):
+        self.script = deque(sorted(script, key=lambda item: item[0]))
+        self.t0 = None
+
+    def poll(self):
+        now = time.monotonic()
+        if self.t0 is None:
+            self.t0 = now
+        out = []
+        while self.script and now - self.t0 >= self.script[0][0]:
+            out.append(self.script.popleft()[1])
+        return out
+
+
+class HotkeyListener:
+    """Hotkeys on their own thread; start/stop/quit also set `cancel` so wait() wakes up early."""
+
+    CANCEL_EVENTS = ("start", "stop", "quit")
+
+    def __init__(self, source, poll_interval=DEFAULT_HOTKEY_POLL_MS / 1000.0):
+        self.source = source
+        self.poll_interval = float(poll_interval)
+        self.events = deque()
+        self.cancel = threading.Event()
+        self.flags = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="hotkeys", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=1.0)
+
+    def post(self, name):
+        with self._lock:
+            if name in self.CANCEL_EVENTS:
+                self.events.append(name)
+                self.cancel.set()
+            else:
+                self.flags[name] = True
+
+    def drain(self):
+        """Returns queued start/stop/quit events (oldest first) and clears the cancel state."""
+        with self._lock:
+            out = list(self.events)
+            self.events.clear()
+            self.cancel.clear()
+        return out
+
+    def take(self, name):
+        with self._lock:
+            return bool(self.flags.pop(name, False))
+
+    def cancel_pending(self):
+        return self.cancel.is_set()
+
+    def wait(self, seconds):
+        return self.cancel.wait(seconds)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                for name in self.source.poll():
+                    self.post(name)
+            except Exception as e:
+                print(f"[hotkeys] source failed, hotkeys disabled: {e!r}")
+                return
+            self._stop.wait(self.poll_interval)
+
+
+class Scheduler:
+    """Deadline-based pacing on a monotonic clock, with achieved vs target rate per label."""
+
+    def __init__(self, hotkeys=None, clock=time.perf_counter):
+        self.hotkeys = hotkeys
+        self.clock = clock
+        self.anchors = {}     # name -> last deadline
+        self.last_tick = {}   # name -> time the previous tick returned
+        self.stats = {}       # label -> {"n", "target_s", "achieved_s", "late"}
+
+    def begin(self, name):
+        now = self.clock()
+        self.anchors[name] = now
+        self.last_tick[name] = now
+
+    def tick(self, name, rng, label=None):
+        label = label or name
+        interval = random.uniform(rng[0], rng[1])
+        now = self.clock()
+        if name not in self.anchors:
+            self.begin(name)
+            now = self.anchors[name]
+
+        deadline = self.anchors[name] + interval
+        st = self.stats.setdefault(label, {"n": 0, "target_s": 0.0, "achieved_s": 0.0, "late": 0})
+        if now - deadline > interval:
+            st["late"] += 1
+            deadline = now
+
+        cancelled = False
+        if deadline > now:
+            cancelled = wait_or_cancel(deadline - now, self.hotkeys)
+
+        done = self.clock()
+        st["n"] += 1
+        st["target_s"] += interval
+        st["achieved_s"] += done - self.last_tick[name]
+        self.anchors[name] = deadline if not cancelled else done
+        self.last_tick[name] = done
+        return cancelled
+
+    def report(self):
+        """label -> {"target_hz", "achieved_hz", "gap_pct", "late", ...raw sums}"""
+        out = {}
+        for label, st in self.stats.items():
+            if st["n"] == 0 or st["achieved_s"] <= 0 or st["target_s"] <= 0:
+                continue
+            target_hz = st["n"] / st["target_s"]
+            achieved_hz = st["n"] / st["achieved_s"]
+            out[label] = {
+                **st,
+                "target_hz": round(target_hz, 3),
+                "achieved_hz": round(achieved_hz, 3),
+                "gap_pct": round((achieved_hz - target_hz) / target_hz * 100.0, 1),
+            }
+        return out
+
+    def summary(self):
+        return " ".join(f"{k}={v['achieved_hz']:.2f}/{v['target_hz']:.2f}Hz" for k, v in self.report().items())
+
+
+class EventLog:
+    """
+    Append-only JSONL log of state transitions, clicks and P_RUN rounds (one object per line).
+    `python report.py events.jsonl` turns it into throughput numbers. path=None disables the file;
+    keep=True also keeps the events in memory (batch mode builds its summary from them).
+    """
+
+    def __init__(self, path, keep=False):
+        self.path = path
+        self.f = None
+        self.kept = [] if keep else None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.f = open(path, "a", encoding="utf-8", buffering=1)  # line buffered
+
+    def emit(self, event, **fields):
+        if self.f is None and self.kept is None:
+            return
+        rec = {"ts": round(time.time(), 3), "event": event, **fields}
+        if self.kept is not None:
+            self.kept.append(rec)
+        if self.f is not None:
+            self.f.write(json.dumps(rec) + "\n")
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+
+class StartupTrace:
+    """
+    Startup latency trace: milliseconds per phase from process start (before the heavy imports)
+    to the first click. `mark(phase)` closes the phase that ran since the previous mark; `add`
+    records a sub-task that ran on a worker thread (its time overlaps the enclosing phase).
+    """
+
+    def __init__(self, t0, imports_done):
+        self.t0 = t0
+        self.last = imports_done
+        self.phases = {"imports": (imports_done - t0) * 1000.0}
+        self.parallel = {}
+        self.first_click_ms = None
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases[phase] = (now - self.last) * 1000.0
+        self.last = now
+
+    def add(self, task, seconds):
+        self.parallel[task] = seconds * 1000.0
+
+    def timed(self, task, fn, *args, **kwargs):
+        t = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.add(task, time.perf_counter() - t)
+
+    def total_ms(self):
+        return (self.last - self.t0) * 1000.0
+
+    def first_click(self):
+        if self.first_click_ms is None:
+            self.first_click_ms = (time.perf_counter() - self.t0) * 1000.0
+        return self.first_click_ms
+
+    def report(self):
+        return {
+            "phases_ms": {k: round(v, 1) for k, v in self.phases.items()},
+            "parallel_ms": {k: round(v, 1) for k, v in self.parallel.items()},
+            "total_ms": round(self.total_ms(), 1),
+        }
+
+    def summary(self):
+        phases = " ".join(f"{k}={v:.0f}ms" for k, v in self.phases.items())
+        parallel = " ".join(f"{k}={v:.0f}" for k, v in self.parallel.items())
+        return f"{phases} ({parallel}) ready={self.total_ms():.0f}ms" if parallel else f"{phases} ready={self.total_ms():.0f}ms"
+
+
+class AdaptiveTimeouts:
+    """Per-state timeouts learned from observed latencies (state entered -> its button detected)."""
+
+    def __init__(self, path, default, enabled=True, percentile=DEFAULT_TIMEOUT_PERCENTILE, margin=DEFAULT_TIMEOUT_MARGIN,
+                 min_s=DEFAULT_TIMEOUT_MIN_SECONDS, max_s=DEFAULT_TIMEOUT_MAX_SECONDS, window=DEFAULT_TIMEOUT_WINDOW,
+                 min_samples=DEFAULT_TIMEOUT_MIN_SAMPLES, recover=DEFAULT_TIMEOUT_RECOVER_VISITS):
+        self.path = path
+        self.default = float(default)
+        self.enabled = enabled
+        self.percentile = float(percentile)
+        self.margin = float(margin)
+        self.min_s = float(min_s)
+        self.max_s = float(max_s)
+        self.window = int(window)
+        self.min_samples = int(min_samples)
+        self.recover = int(recover)
+        self.samples = {}  # state -> deque of latencies
+        self.backoff = {}  # state -> visits left before the learned timeout may drop below `default` again
+        self.dirty = False
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            for state, values in data.get("samples", {}).items():
+                self.samples[state] = deque((float(v) for v in values), maxlen=self.window)
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            print(f"[timeouts] Ignoring {self.path}: {e}")
+
+    def observe(self, state, latency):
+        self.samples.setdefault(state, deque(maxlen=self.window)).append(float(latency))
+        if self.backoff.get(state):
+            self.backoff[state] -= 1
+        self.dirty = True
+
+    def observe_timeout(self, state, elapsed):
+        """The state timed out before its button was seen (censored at `elapsed`)."""
+        self.samples.setdefault(state, deque(maxlen=self.window)).append(float(elapsed))
+        self.backoff[state] = self.recover
+        self.dirty = True
+
+    def timeout(self, state):
+        values = self.samples.get(state)
+        if not self.enabled or not values or len(values) < self.min_samples:
+            return self.default
+        v = sorted(values)
+        k = (len(v) - 1) * self.percentile
+        lo = int(k)
+        hi = min(lo + 1, len(v) - 1)
+        p = v[lo] + (v[hi] - v[lo]) * (k - lo)
+        t = min(self.max_s, max(self.min_s, p * self.margin))
+        if self.backoff.get(state):
+            t = max(t, self.default)
+        return t
+
+    def report(self):
+        return {state: {"n": len(values), "timeout": round(self.timeout(state), 3), "backoff": self.backoff.get(state, 0)}
+                for state, values in self.samples.items()}
+
+    def save(self):
+        if not self.path or not self.dirty:
+            return
+        data = {
+            "samples": {state: [round(v, 3) for v in values] for state, values in self.samples.items()},
+            "timeouts": {state: r["timeout"] for state, r in self.report().items()},
+        }
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+
+class FlightRecorder:
+    """
+    Bounded in-memory ring of the last `seconds` of downscaled JPEG frames + HUD metadata.
+
+    record() is throttled to `fps`, so most calls return immediately; the rest pay one resize
+    and one imencode. Memory is capped at `max_mb` (oldest frames are evicted first).
+    dump() writes the ring to `dump_dir/<timestamp>_<reason>/` on a background thread; close() waits for them.
+    """
+
+    def __init__(self, seconds, fps, scale, jpeg_quality, max_mb, dump_dir, max_dumps):
+        self.seconds = float(seconds)
+        self.min_period = 1.0 / max(0.1, float(fps))
+        self.scale = float(scale)
+        self.encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), int(jpeg_quality)]
+        self.max_bytes = int(float(max_mb) * 1024 * 1024)
+        self.dump_dir = dump_dir
+        self.max_dumps = int(max_dumps)
+
+        self.frames = deque()   # (ts, jpeg_bytes, meta)
+        self.total_bytes = 0
+        self.last_record_ts = 0.0
+        self.last_dump_ts = 0.0
+        self.writers = []       # dump threads still running
+
+    def record(self, frame_bgr, meta):
+        now = time.time()
+        if now - self.last_record_ts < self.min_period:
+            return
+        self.last_record_ts = now
+
+        if self.scale < 1.0:
+            H, W = frame_bgr.shape[:2]
+            small = cv2.resize(frame_bgr, (int(W * self.scale), int(H * self.scale)), interpolation=cv2.INTER_AREA)
+        else:
+            small = frame_bgr
+        ok, buf = cv2.imencode(".jpg", small, self.encode_params)
+        if not ok:
+            return
+
+        data = buf.tobytes()
+        self.frames.append((now, data, dict(meta)))
+        self.total_bytes += len(data)
+
+        while self.frames and (self.total_bytes > self.max_bytes or now - self.frames[0][0] > self.seconds):
+            _ts, old, _m = self.frames.popleft()
+            self.total_bytes -= len(old)
+
+    def dump(self, reason, meta=None):
+        # only frames not already written by a previous dump (stuck loops would repeat them)
+        frames = [f for f in self.frames if f[0] > self.last_dump_ts]
+        if not frames:
+            return None
+        self.last_dump_ts = frames[-1][0]
+
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime())
+        safe_reason = "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in reason)
+        out_dir = os.path.join(self.dump_dir, f"{stamp}_{safe_reason}")
+
+        writer = threading.Thread(
+            target=self._write, args=(out_dir, reason, meta or {}, frames), name="flight-dump", daemon=True
+        )
+        writer.start()
+        self.writers = [t for t in self.writers if t.is_alive()] + [writer]
+        print(f"[recorder] Dumping {len(frames)} frame(s) -> {out_dir}")
+        return out_dir
+
+    def close(self, timeout=10.0):
+        """Wait for pending dumps (daemon threads would be killed mid-write on exit)."""
+        deadline = time.monotonic() + timeout
+        for t in self.writers:
+            t.join(max(0.0, deadline - time.monotonic()))
+        self.writers = [t for t in self.writers if t.is_alive()]
+        if self.writers:
+            print(f"[recorder] {len(self.writers)} dump(s) still being written at exit.")
+
+    def _write(self, out_dir, reason, meta, frames):
+        os.makedirs(out_dir, exist_ok=True)
+        index = []
+        for i, (ts, data, m) in enumerate(frames):
+            name = f"frame_{i:04d}.jpg"
+            with open(os.path.join(out_dir, name), "wb") as f:
+                f.write(data)
+            index.append({"file": name, "ts": ts, **m})
+
+        with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"reason": reason, "dumped_at": time.time(), **meta, "frames": index}, f, indent=2)
+
+        self._prune()
+
+    def _prune(self):
+        try:
+            dumps = sorted(
+                d for d in os.listdir(self.dump_dir) if os.path.isdir(os.path.join(self.dump_dir, d))
+            )
+        except OSError:
+            return
+        for d in dumps[:-self.max_dumps] if self.max_dumps > 0 else []:
+            shutil.rmtree(os.path.join(self.dump_dir, d), ignore_errors=True)
+
+
+def make_flight_recorder(config, base_dir):
+    rec_cfg = config.get("recorder", {})
+    if not bool(rec_cfg.get("enabled", True)):
+        return None
+    dump_dir = rec_cfg.get("dump_dir", DEFAULT_RECORDER_DUMP_DIR)
+    return FlightRecorder(
+        seconds=rec_cfg.get("seconds", DEFAULT_RECORDER_SECONDS),
+        fps=rec_cfg.get("fps", DEFAULT_RECORDER_FPS),
+        scale=rec_cfg.get("scale", DEFAULT_RECORDER_SCALE),
+        jpeg_quality=rec_cfg.get("jpeg_quality", DEFAULT_RECORDER_JPEG_QUALITY),
+        max_mb=rec_cfg.get("max_mb", DEFAULT_RECORDER_MAX_MB),
+        dump_dir=os.path.join(base_dir, dump_dir),
+        max_dumps=rec_cfg.get("max_dumps", DEFAULT_RECORDER_MAX_DUMPS),
+    )
+
+
+class DebugRenderer:
+    """
+    Debug window on its own thread.
+
+    At most `max_fps` times per second, the main loop copies the frame it already grabbed into a
+    preallocated back buffer (its own buffers are reused on the next grab), together with the matches it
+    already computed for that frame; other submits are dropped without copying. This thread swaps the
+    snapshot in, downscales it, draws boxes + HUD and pumps the highgui event loop. It never matches templates itself, so it stays cheap next to detection.
+    Pressing `q` in the window calls `on_quit`.
+    """
+
+    def __init__(self, window_name, window_pos, max_fps, render_width, show_scores, on_quit=None):
+        self.window_name = window_name
+        self.window_pos = window_pos
+        self.min_period = 1.0 / max(0.5, float(max_fps))
+        self.render_width = int(render_width)
+        self.show_scores = show_scores
+        self.on_quit = on_quit
+
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._back = None    # bgr frame written by submit
+        self._front = None   # bgr frame owned by the render thread
+        self._meta = None    # (hud_lines, action, matches)
+        self._seq = 0
+        self._last_submit = None  # perf_counter of the last accepted snapshot
+        self._thread = threading.Thread(target=self._run, name="debug-renderer", daemon=True)
+
+    def start(self):
+        # highgui (window creation) only happens on the render thread, so deferring this to the first
+        # submit keeps it off the startup path
+        if self._thread.ident is None:
+            self._thread.start()
+        return self
+
+    def submit(self, frame_bgr, hud_lines, action, matches=()):
+        """`matches`: [(label, (score, loc, valid, reason, templ)), ...] found on this frame by the main loop."""
+        now = time.perf_counter()
+        if self._last_submit is not None and now - self._last_submit < self.min_period:
+            return False
+        self._last_submit = now
+        self.start()
+        with self._lock:
+            if self._back is None or self._back.shape != frame_bgr.shape:
+                self._back = frame_bgr.copy()
+            else:
+                np.copyto(self._back, frame_bgr)
+            self._meta = (hud_lines, action, list(matches))
+            self._seq += 1
+        return True
+
+    def close(self):
+        self._stop.set()
+        if self._thread.ident is not None:
+            self._thread.join(timeout=2.0)
+
+    def _take(self, last_seq):
+        with self._lock:
+            if self._seq == last_seq:
+                return None, last_seq
+            self._front, self._back = self._back, self._front
+            return (self._front, *self._meta), self._seq
+
+    def _render(self, frame_bgr, hud_lines, action, matches):
+        H, W = frame_bgr.shape[:2]
+        scale = min(1.0, self.render_width / float(W))
+        if scale < 1.0:
+            view = cv2.resize(frame_bgr, (int(W * scale), int(H * scale)), interpolation=cv2.INTER_AREA)
+        else:
+            view = frame_bgr.copy()
+
+        scores = []
+        if self.show_scores:
+            for name, (score, (x, y), ok, reason, templ) in matches:
+                scores.append(f"{name}={score:.3f}")
+                if score <= 0.30:
+                    continue
+                x1, y1 = int(x * scale), int(y * scale)
+                x2, y2 = int((x + templ["w"]) * scale), int((y + templ["h"]) * scale)
+                cv2.rectangle(view, (x1, y1), (x2, y2), (0, 0, 255), 2)
+                tag = f"{name} {score:.2f}" + ("" if ok else " !")
+                draw_text_with_bg(view, tag, x1, max(20, y1 - 6), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+                if not ok:
+                    draw_text_with_bg(view, reason[:28], x1, min(view.shape[0] - 6, y2 + 16),
+                                      cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
+
+        lines = list(hud_lines)
+        if scores:
+            lines.append("scores: " + " ".join(scores))
+        lines.append(f"action: {action}")
+        for i, line in enumerate(lines):
+            draw_text_with_bg(view, line, 10, 22 + i * 19, cv2.FONT_HERSHEY_SIMPLEX, 0.48, (0, 255, 255), 1)
+        return view
+
+    def _run(self):
+        # highgui windows must be created and pumped from the same thread
+        cv2.namedWindow(self.window_name, cv2.WINDOW_NORMAL)
+        cv2.resizeWindow(self.window_name, self.render_width, int(self.render_width * 650 / 1100))
+        cv2.moveWindow(self.window_name, *self.window_pos)
+
+        last_seq = 0
+        next_tick = time.perf_counter()
+        while not self._stop.is_set():
+            snap, last_seq = self._take(last_seq)
+            if snap is not None:
+                cv2.imshow(self.window_name, self._render(*snap))
+
+            if cv2.waitKey(1) & 0xFF == ord("q") and self.on_quit is not None:
+                self.on_quit()
+
+            next_tick += self.min_period
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                self._stop.wait(delay)
+            else:
+                next_tick = time.perf_counter()
+
+        cv2.destroyWindow(self.window_name)
+
+
+def main(config=None, sct_factory=None, click=sendinput_click, hotkey_source=None, batch=None):
+    """
+    Runs the loop. The defaults drive the real game (config.json, mss, SendInput, keyboard hotkeys);
+    simulator.py swaps in a synthetic screen, a mock input sink and a scripted hotkey source.
+
+    batch = {"cycles": N, "seconds": T, "stall_seconds": S} (any may be None) starts running at once
+    and quits after N cycles / T seconds, or when no button click was verified for S seconds (stalled;
+    a stuck UI still "completes" cycles through state timeouts and the blind CENTER click).
+    Returns the summary dict in batch mode (report.build_report of this session + "batch"), else None.
+    """
+    trace = StartupTrace(STARTUP_T0, IMPORTS_DONE)
+    if config is None:
+        config = load_config()
+    if sct_factory is None:
+        from mss import mss as sct_factory
 
     monitor_index = int(config["monitor"]["index"])
     debug_config = config.get("debug", {})
     show_window = bool(debug_config.get("show_window", True))
     window_monitor_index = int(debug_config.get("window_monitor_index", monitor_index))
+    show_scores = bool(debug_config.get("show_scores", True))
+    debug_max_fps = float(debug_config.get("max_fps", DEFAULT_DEBUG_MAX_FPS))
+    debug_render_width = int(debug_config.get("render_width", DEFAULT_DEBUG_RENDER_WIDTH))
 
     det_config = config["detection"]
     click_config = config["click"]
@@ -539,6 +1600,8 @@ def main():
     p_interval_range = tuple(auto.get("p_interval_range", list(DEFAULT_P_INTERVAL_RANGE)))
     p_duration_seconds = float(auto.get("p_duration_seconds", DEFAULT_P_DURATION_SECONDS))
     state_timeout_seconds = float(auto.get("state_timeout_seconds", DEFAULT_STATE_TIMEOUT_SECONDS))
+    p_end_on_collect = bool(auto.get("p_end_on_collect", DEFAULT_P_END_ON_COLLECT))
+    p_settle_seconds = float(auto.get("p_settle_seconds", DEFAULT_P_SETTLE_SECONDS))
 
     white_cutoff = int(auto.get("white_cutoff", DEFAULT_WHITE_CUTOFF))
     mask_mode = auto.get("mask_mode", "auto")
@@ -558,47 +1621,120 @@ def main():
     bg_border = int(auto.get("bg_border", DEFAULT_BG_BORDER))
     bg_max_mean = int(auto.get("bg_max_mean", DEFAULT_BG_MAX_MEAN))
     topk = int(auto.get("topk_tries", DEFAULT_TOPK_TRIES))
+    prefilter = None
+    if bool(auto.get("prefilter", True)):
+        prefilter = MatchPrefilter(
+            stride=int(auto.get("prefilter_stride", DEFAULT_PREFILTER_STRIDE)),
+            audit_rate=float(auto.get("prefilter_audit_rate", DEFAULT_PREFILTER_AUDIT_RATE)),
+        )
 
-    start_vk = vk_from_key(start_key)
-    cancel_vk = vk_from_key(cancel_key)
+    dump_key = config.get("recorder", {}).get("dump_key", DEFAULT_DUMP_KEY)
+    hotkey_poll_ms = float(auto.get("hotkey_poll_ms", DEFAULT_HOTKEY_POLL_MS))
+    if hotkey_source is None:
+        hotkey_source = KeyboardHotkeySource([(start_key, "start"), (cancel_key, "stop"), (dump_key, "dump")])
+    hotkeys = HotkeyListener(
+        hotkey_source,
+        poll_interval=hotkey_poll_ms / 1000.0,
+    )
 
     base_dir = os.path.dirname(os.path.abspath(__file__))
-    images_dir = os.path.join(base_dir, config.get("files", {}).get("images_dir", "images"))
+    recorder = make_flight_recorder(config, base_dir)
+    files_config = config.get("files", {})
+    images_dir = os.path.join(base_dir, files_config.get("images_dir", "images"))
+    events_file = files_config.get("events_file", DEFAULT_EVENTS_FILE)
+    events = EventLog(os.path.join(base_dir, events_file) if events_file else None, keep=batch is not None)
+    timeouts_file = files_config.get("timeouts_file", DEFAULT_TIMEOUTS_FILE)
+    timeouts = AdaptiveTimeouts(
+        os.path.join(base_dir, timeouts_file) if timeouts_file else None,
+        default=state_timeout_seconds,
+        enabled=bool(auto.get("adaptive_timeouts", True)),
+        percentile=float(auto.get("timeout_percentile", DEFAULT_TIMEOUT_PERCENTILE)),
+        margin=float(auto.get("timeout_margin", DEFAULT_TIMEOUT_MARGIN)),
+        min_s=float(auto.get("timeout_min_seconds", DEFAULT_TIMEOUT_MIN_SECONDS)),
+        max_s=float(auto.get("timeout_max_seconds", DEFAULT_TIMEOUT_MAX_SECONDS)),
+        window=int(auto.get("timeout_window", DEFAULT_TIMEOUT_WINDOW)),
+        min_samples=int(auto.get("timeout_min_samples", DEFAULT_TIMEOUT_MIN_SAMPLES)),
+        recover=int(auto.get("timeout_recover_visits", DEFAULT_TIMEOUT_RECOVER_VISITS)),
+    )
 
-    put_path = os.path.join(images_dir, "put-snow.png")
-    start_path = os.path.join(images_dir, "start-snow.png")
-    collect_path = os.path.join(images_dir, "collect-sculture.png")
 
     NEXT_STATE = {"PUT": "START", "START": "P_RUN", "COLLECT": "CENTER", "CENTER": "PUT"}
 
     window_name = "Auto Snow Loop (verified clicks)"
-    if show_window:
-        cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
-        cv2.resizeWindow(window_name, 1100, 650)
+    renderer = None
+
+    batch_cycles = batch_seconds = batch_stall_seconds = None
+    if batch is not None:
+        batch_cycles = batch.get("cycles")
+        batch_seconds = batch.get("seconds")
+        batch_stall_seconds = batch.get("stall_seconds") or DEFAULT_BATCH_STALL_SECONDS
+    exit_reason = "quit"
+    run_start_ts = None
+    progress_ts = None  # last verified button click (batch stall detection)
 
     print(f"Idle. START={start_key} | STOP={cancel_key} | exit=q")
 
     running = False
     state = "PUT"
     cycle = 0
-    state_enter_ts = time.time()
-
-    last_put = 0.0
-    last_start = 0.0
-    last_collect = 0.0
-
-    with mss() as sct:
-        if show_window:
-            move_debug_window(window_name, sct, window_monitor_index)
+    state_enter_ts = time.monotonic()
+    state_seen = False  # current state's button already detected (latency recorded)
+    cycle_start_ts = state_enter_ts
+
+    last_click = {"PUT": 0.0, "START": 0.0, "COLLECT": 0.0}
+
+    def traced_click(x, y):
+        if trace.first_click_ms is None:
+            # since process start, and since the run was started (the idle wait for the hotkey excluded)
+            events.emit("first_click", ms=round(trace.first_click(), 1),
+                        run_ms=round((time.monotonic() - run_start_ts) * 1000.0, 1) if run_start_ts else None)
+        click(x, y)
+
+    trace.mark("config")
+
+    # templates only need the config and points only need the monitor size, so both load on worker
+    # threads (cv2 releases the GIL) while this thread opens the screen and grabs the first frame
+    templ_kwargs = {"mask_mode": mask_mode, "white_cutoff": white_cutoff, "bright_thr": bright_thr, "dark_thr": dark_thr}
+    loader = ThreadPoolExecutor(max_workers=4, thread_name_prefix="startup")
+    # Load icon templates (from images/)
+    # each button: images/<name>.png and/or images/<name>/*.png variants
+    templ_futures = [
+        loader.submit(trace.timed, f"templ_{name}", load_icon_variants, images_dir, name, **templ_kwargs)
+        for name in ("put-snow", "start-snow", "collect-sculture")
+    ]
 
+    with sct_factory() as sct:
         # Get monitor geometry once (for points resolution + center click)
         mon_left, mon_top, mon_w, mon_h = pick_monitor_rect(sct, monitor_index)
         monitor = {"left": mon_left, "top": mon_top, "width": mon_w, "height": mon_h}
+        # Points resolution fallback (+ the empty-slot baselines stored next to them)
+        def load_points():
+            points_file, lp, rp, rect = resolve_points(config, mon_w, mon_h)
+            baselines = None
+            if det_config.get("slot_baselines", True):
+                baselines = load_slot_baselines(points_file, len(lp), len(rp), det_config)
+            return points_file, lp, rp, rect, baselines
+
+        points_future = loader.submit(trace.timed, "points", load_points)
+        trace.mark("screen")
+
+        # first grab allocates the pool buffers and warms up the capture backend
+        pool = BufferPool(mon_w, mon_h)
+        pool.grab(sct, monitor)
+        trace.mark("first_frame")
+
+        points_used, left_points, right_points, pts_mon_rect, slot_baselines = points_future.result()
+        put_t, start_t, collect_t = (f.result() for f in templ_futures)
+        loader.shutdown()
+        trace.mark("load")
 
-        # Points resolution fallback
-        points_used, left_points, right_points, pts_mon_rect = resolve_points(config, mon_w, mon_h)
         all_points = left_points + right_points
 
+        slot_prefilter = bool(det_config.get("slot_prefilter", True))
+        if slot_prefilter and slot_baselines:
+            n_base = sum(b is not None for b in slot_baselines)
+            print(f"[points] Empty-slot baselines: {n_base}/{len(slot_baselines)} slots")
+
         # optional: warn if points metadata disagree
         if isinstance(pts_mon_rect, dict):
             pw = pts_mon_rect.get("width")
@@ -607,187 +1743,346 @@ def main():
                 print(f"[warn] points were recorded on {pw}x{ph}, but current monitor is {mon_w}x{mon_h}.")
                 print("[warn] Expect misalignment. Re-capture points for this resolution (check README).")
 
-        # Load icon templates (from images/)
-        put_t = load_icon_template(put_path, mask_mode=mask_mode, white_cutoff=white_cutoff, bright_thr=bright_thr, dark_thr=dark_thr)
-        start_t = load_icon_template(start_path, mask_mode=mask_mode, white_cutoff=white_cutoff, bright_thr=bright_thr, dark_thr=dark_thr)
-        collect_t = load_icon_template(collect_path, mask_mode=mask_mode, white_cutoff=white_cutoff, bright_thr=bright_thr, dark_thr=dark_thr)
-
-        while True:
-            frame_bgr, frame_gray = grab_frame(sct, monitor)
-
-            # hotkeys
-            if is_key_toggled(start_vk):
-                running = True
-                state = "PUT"
-                cycle = 0
-                state_enter_ts = time.time()
-                print("START -> running")
-
-            if is_key_toggled(cancel_vk):
-                running = False
-                state = "PUT"
-                state_enter_ts = time.time()
+        for tset in (put_t, start_t, collect_t):
+            if len(tset.variants) > 1:
+                print(f"[templates] {tset.name}: {len(tset.variants)} variants")
+
+        click_states = {
+            "PUT": {"templ": put_t, "thr": thr_put, "confirm": "next", "templ_next": start_t, "thr_next": thr_start},
+            "START": {"templ": start_t, "thr": thr_start, "confirm": "gone", "templ_next": None, "thr_next": 0.0},
+            "COLLECT": {"templ": collect_t, "thr": thr_collect, "confirm": "gone", "templ_next": None, "thr_next": 0.0},
+        }
+
+        if show_window:
+            renderer = DebugRenderer(
+                window_name, debug_window_pos(sct, window_monitor_index),
+                max_fps=debug_max_fps, render_width=debug_render_width, show_scores=show_scores,
+                on_quit=lambda: hotkeys.post("quit"),
+            )  # the render thread (and its window) starts on the first submitted frame
+
+        hotkeys.start()
+        if batch is not None:
+            hotkeys.post("start")
+        scheduler = Scheduler(hotkeys)
+
+        events.emit(
+            "session_start", monitor=[mon_w, mon_h], points=os.path.basename(points_used), slots=len(all_points),
+            state_pause_range=list(state_pause_range), p_interval_range=list(p_interval_range),
+            p_duration_seconds=p_duration_seconds, p_settle_seconds=p_settle_seconds, p_end_on_collect=p_end_on_collect,
+            state_timeout_seconds=state_timeout_seconds, timeouts=timeouts.report(),
+            thr={"put": thr_put, "start": thr_start, "collect": thr_collect},
+        )
+        trace.mark("setup")
+        events.emit("startup", **trace.report())
+        print(f"[startup] {trace.summary()}")
+
+        def set_state(new_state, outcome):
+            nonlocal state, state_enter_ts, state_seen, progress_ts
+            now = time.monotonic()
+            if outcome == "clicked" and state in click_states:
+                progress_ts = now
+            events.emit("state_exit", state=state, entered=round(time.time() - (now - state_enter_ts), 3),
+                        duration=round(now - state_enter_ts, 3), outcome=outcome, next=new_state,
+                        timeout=round(timeouts.timeout(state), 3), cycle=cycle)
+            state = new_state
+            state_enter_ts = now
+            state_seen = False
+
+        def hud_lines(dt_ms):
+            state_age = time.monotonic() - state_enter_ts
+            return [
+                f"{'RUNNING' if running else 'IDLE'} | state={state} | cycle={cycle} | dt={dt_ms:.0f}ms",
+                f"START={start_key} | STOP={cancel_key} | exit=q | state_age={state_age:.1f}s timeout={timeouts.timeout(state):.1f}s",
+                f"points={os.path.basename(points_used)} | images_dir={os.path.basename(images_dir)}",
+                f"thr: put={thr_put:.2f} start={thr_start:.2f} collect={thr_collect:.2f}",
+                f"verify: retries={retries} delay={verify_delay_range[0]:.2f}-{verify_delay_range[1]:.2f}s cooldown={cooldown:.2f}s",
+                f"pause={state_pause_range[0]:.1f}-{state_pause_range[1]:.1f}s | P={p_interval_range[0]:.1f}-{p_interval_range[1]:.1f}s | Pdur<={p_duration_seconds:.0f}s settle={p_settle_seconds:.1f}s",
+                f"pace (achieved/target): {scheduler.summary() or '-'}",
+            ]
+
+        def overlay(tset, m):
+            # debug window label: the button, or the variant that matched when there are several
+            return (m[4]["name"] if len(tset.variants) > 1 else tset.name, m)
+
+        def stop_run(outcome):
+            nonlocal running, state, state_enter_ts, state_seen
+            if running:
+                set_state("PUT", outcome)
+                events.emit("run_stop", cycle=cycle, reason=outcome)
+                events.emit("pacing", rates=scheduler.report())
+                if prefilter is not None:
+                    events.emit("prefilter", templates=prefilter.report())
+                events.emit("variants", buttons={t.name: t.report() for t in (put_t, start_t, collect_t)})
+                timeouts.save()
                 print("STOP -> idle")
+            running = False
+            state = "PUT"
+            state_enter_ts = time.monotonic()
+            state_seen = False
+
+        quit_requested = False
+        while not quit_requested:
+            # hotkeys (queued by the listener thread)
+            for ev in hotkeys.drain():
+                if ev == "start":
+                    if running:
+                        set_state("PUT", "restart")
+                    running = True
+                    state = "PUT"
+                    cycle = 0
+                    state_enter_ts = time.monotonic()
+                    state_seen = False
+                    cycle_start_ts = state_enter_ts
+                    run_start_ts = progress_ts = state_enter_ts
+                    events.emit("run_start")
+                    print("START -> running")
+
+                elif ev == "stop":
+                    stop_run("cancel")
+                    if batch is not None:
+                        # no window to quit from in batch mode: stop ends the run (summary still returned)
+                        exit_reason = "cancel"
+                        quit_requested = True
+
+                elif ev == "quit":
+                    quit_requested = True
+
+            # batch limits: cycle budget, time budget, stall (no verified click for too long)
+            if batch is not None and running:
+                now = time.monotonic()
+                if batch_cycles and cycle >= batch_cycles:
+                    exit_reason = "cycles"
+                elif batch_seconds and now - run_start_ts >= batch_seconds:
+                    exit_reason = "time"
+                elif now - progress_ts >= batch_stall_seconds:
+                    exit_reason = "stalled"
+                    print(f"[batch] No verified click in {batch_stall_seconds:.0f}s (state={state}) -> stalled")
+                    if recorder is not None:
+                        recorder.dump("stalled", {"state": state, "cycle": cycle})
+                if exit_reason != "quit":
+                    stop_run(exit_reason)
+                    quit_requested = True
+
+            if quit_requested:
+                break
+
+            if hotkeys.take("dump") and recorder is not None:
+                recorder.dump("hotkey", {"state": state, "cycle": cycle})
+
+            frame_bgr, frame_gray = pool.grab(sct, monitor)
+            frame_ts = time.monotonic()
 
             action = "idle"
             note = "-"
+            matches = []  # (label, match) computed on this frame, for the debug window
 
             # state timeout (except P_RUN): skip to next
             if running and state != "P_RUN":
-                if (time.time() - state_enter_ts) >= state_timeout_seconds:
+                # the learned timeout covers waiting for the button; once it was seen, clicking it gets the full budget
+                state_timeout = timeouts.timeout(state)
+                if state_seen:
+                    state_timeout = max(state_timeout, state_timeout_seconds)
+                if (frame_ts - state_enter_ts) >= state_timeout:
                     prev = state
-                    state = NEXT_STATE.get(state, "PUT")
-                    state_enter_ts = time.time()
+                    # timed out waiting for the button: censored latency sample
+                    censored = frame_ts - state_enter_ts if state in click_states and not state_seen else None
+                    set_state(NEXT_STATE.get(state, "PUT"), "timeout")
+                    if censored is not None:
+                        timeouts.observe_timeout(prev, censored)
                     action = f"TIMEOUT {prev} -> {state}"
                     note = "state_timeout"
+                    if recorder is not None:
+                        recorder.dump(f"timeout_{prev}", {"state": prev, "cycle": cycle,
+                                                          "state_timeout_seconds": state_timeout})
 
-            t0 = time.time()
+            t0 = time.perf_counter()
+            scan_label = state if running else "IDLE"  # state this iteration scans in (before any transition)
+            blocked = False  # iteration ran a click/verify, P_RUN or a pause: not a scan interval
 
             if running:
-                if state == "PUT":
-                    clicked, score0, _loc0, last_put, note = click_with_verification(
+                if state in click_states:
+                    cs = click_states[state]
+                    clicked, match0, last_click[state], note = click_with_verification(
                         sct=sct, monitor=monitor, frame_gray=frame_gray,
                         monitor_left=mon_left, monitor_top=mon_top,
-                        templ_current=put_t, thr_click=thr_put,
+                        templ_current=cs["templ"], thr_click=cs["thr"],
                         click_delay=click_delay, click_jitter=click_jitter,
-                        last_click_ts=last_put, cooldown=cooldown,
+                        last_click_ts=last_click[state], cooldown=cooldown,
                         retries=retries, verify_delay_range=verify_delay_range,
-                        confirm_mode="next", templ_next=start_t, thr_next=thr_start,
+                        confirm_mode=cs["confirm"], templ_next=cs["templ_next"], thr_next=cs["thr_next"],
                         topk=topk, bright_tol=bright_tol, dark_tol=dark_tol,
-                        bg_border=bg_border, bg_max_mean=bg_max_mean,
+                        bg_border=bg_border, bg_max_mean=bg_max_mean, recorder=recorder, hotkeys=hotkeys,
+                        click=traced_click, prefilter=prefilter, pool=pool,
                     )
-                    action = f"PUT score={score0:.3f} ({note})"
-                    if clicked:
-                        short_pause(state_pause_range)
-                        state = "START"
-                        state_enter_ts = time.time()
-
-                elif state == "START":
-                    clicked, score0, _loc0, last_start, note = click_with_verification(
-                        sct=sct, monitor=monitor, frame_gray=frame_gray,
-                        monitor_left=mon_left, monitor_top=mon_top,
-                        templ_current=start_t, thr_click=thr_start,
-                        click_delay=click_delay, click_jitter=click_jitter,
-                        last_click_ts=last_start, cooldown=cooldown,
-                        retries=retries, verify_delay_range=verify_delay_range,
-                        confirm_mode="gone", templ_next=None, thr_next=0.0,
-                        topk=topk, bright_tol=bright_tol, dark_tol=dark_tol,
-                        bg_border=bg_border, bg_max_mean=bg_max_mean,
-                    )
-                    action = f"START score={score0:.3f} ({note})"
-                    if clicked:
-                        short_pause(state_pause_range)
-                        state = "P_RUN"
-                        state_enter_ts = time.time()
+                    score0 = match0[0]
+                    matches.append(overlay(cs["templ"], match0))
+                    blocked = note != "cooldown" and not note.startswith("no_match")
+                    action = f"{state} score={score0:.3f} ({note})"
+                    if not state_seen and note not in ("cooldown", "cancelled") and not note.startswith("no_match"):
+                        # first detection of this state's button in this visit
+                        state_seen = True
+                        timeouts.observe(state, frame_ts - state_enter_ts)
+                        events.emit("appear", state=state, latency=round(frame_ts - state_enter_ts, 3), cycle=cycle)
+                    if note not in ("cooldown", "cancelled") and not note.startswith("no_match"):
+                        events.emit("click", state=state, score=round(score0, 4), ok=clicked, note=note, cycle=cycle)
+                    if recorder is not None and note == "retries_exhausted":
+                        recorder.dump(f"retries_exhausted_{state}", {"state": state, "cycle": cycle, "score": score0})
+                    if clicked and not short_pause(state_pause_range, hotkeys):
+                        set_state(NEXT_STATE[state], "clicked")
 
                 elif state == "P_RUN":
-                    p_start = time.time()
+                    blocked = True
+                    p_start = time.monotonic()
                     p_deadline = p_start + p_duration_seconds
+                    last_hit_ts = None
                     rounds = 0
                     total_matches = 0
+                    total_skipped = 0
+                    end_reason = "duration"
                     action = f"P running ({p_duration_seconds:.0f}s)"
+                    cancelled = False
 
-                    while time.time() < p_deadline:
-                        if is_key_toggled(cancel_vk):
-                            running = False
-                            state = "PUT"
-                            state_enter_ts = time.time()
-                            print("STOP (during P_RUN) -> idle")
+                    scheduler.begin("P_RUN")
+                    while time.monotonic() < p_deadline:
+                        # stop/quit are handled at the top of the main loop
+                        if hotkeys.cancel_pending():
+                            cancelled = True
                             break
 
-                        f2_bgr, _ = grab_frame(sct, monitor)
-                        m = run_p_routine_once(f2_bgr, mon_left, mon_top, all_points, config, click_delay, click_jitter)
-                        total_matches += m
+                        if hotkeys.take("dump") and recorder is not None:
+                            recorder.dump("hotkey", {"state": state, "cycle": cycle})
+
+                        f2_bgr, f2_gray = pool.grab(sct, monitor, "aux")
+
+                        # minigame over: the collect button is already up
+                        p_matches = []
+                        if p_end_on_collect:
+                            m_col = collect_t.match(f2_gray, thr_collect, topk, bright_tol, dark_tol,
+                                                    bg_border, bg_max_mean, prefilter=prefilter, pool=pool, record=False)
+                            p_matches.append(overlay(collect_t, m_col))
+                            s_col, _l, v_col, _r, _t = m_col
+                            if v_col and s_col >= thr_collect:
+                                end_reason = "collect"
+                                break
+
+                        hits, skipped = run_p_routine_once(f2_bgr, mon_left, mon_top, all_points, config,
+                                                           click_delay, click_jitter, slot_prefilter, hotkeys, traced_click, pool,
+                                                           slot_baselines)
+                        total_matches += len(hits)
+                        total_skipped += skipped
                         rounds += 1
+                        events.emit("p_round", round=rounds, hits=hits, skipped=skipped, cycle=cycle)
+
+                        p_action = f"P round={rounds} matches={total_matches} dark={total_skipped}"
+                        if recorder is not None:
+                            recorder.record(f2_bgr, {"state": state, "cycle": cycle, "action": p_action})
+                        if renderer is not None:
+                            renderer.submit(f2_bgr, hud_lines((time.perf_counter() - t0) * 1000), p_action, p_matches)
+
+                        # minigame over: every slot stayed dark for the settle window
+                        now = time.monotonic()
+                        if hits:
+                            last_hit_ts = now
+                        elif p_settle_seconds > 0 and last_hit_ts is not None and now - last_hit_ts >= p_settle_seconds:
+                            end_reason = "settled"
+                            break
 
-                        time.sleep(random.uniform(p_interval_range[0], p_interval_range[1]))
-
-                        if show_window:
-                            cv2.waitKey(1)
+                        if scheduler.tick("P_RUN", p_interval_range, label="P_ROUND"):
+                            cancelled = True
+                            break
 
-                    if running:
-                        elapsed = time.time() - p_start
-                        action = f"P done rounds={rounds} matches={total_matches} elapsed={elapsed:.1f}s"
-                        short_pause(state_pause_range)
-                        state = "COLLECT"
-                        state_enter_ts = time.time()
-
-                elif state == "COLLECT":
-                    clicked, score0, _loc0, last_collect, note = click_with_verification(
-                        sct=sct, monitor=monitor, frame_gray=frame_gray,
-                        monitor_left=mon_left, monitor_top=mon_top,
-                        templ_current=collect_t, thr_click=thr_collect,
-                        click_delay=click_delay, click_jitter=click_jitter,
-                        last_click_ts=last_collect, cooldown=cooldown,
-                        retries=retries, verify_delay_range=verify_delay_range,
-                        confirm_mode="gone", templ_next=None, thr_next=0.0,
-                        topk=topk, bright_tol=bright_tol, dark_tol=dark_tol,
-                        bg_border=bg_border, bg_max_mean=bg_max_mean,
-                    )
-                    action = f"COLLECT score={score0:.3f} ({note})"
-                    if clicked:
-                        short_pause(state_pause_range)
-                        state = "CENTER"
-                        state_enter_ts = time.time()
+                    if not cancelled:
+                        elapsed = time.monotonic() - p_start
+                        saved = max(0.0, p_duration_seconds - elapsed)
+                        action = (f"P done ({end_reason}) rounds={rounds} matches={total_matches} "
+                                  f"dark={total_skipped} elapsed={elapsed:.1f}s saved={saved:.1f}s")
+                        events.emit("p_done", rounds=rounds, matches=total_matches, elapsed=round(elapsed, 3),
+                                    end=end_reason, saved=round(saved, 3), cycle=cycle)
+                        if not short_pause(state_pause_range, hotkeys):
+                            set_state("COLLECT", "done")
 
                 elif state == "CENTER":
+                    blocked = True
                     cx = mon_left + mon_w // 2
                     cy = mon_top + mon_h // 2
-                    sendinput_click(cx, cy)
-                    jitter_sleep(click_delay, click_jitter)
-                    short_pause(state_pause_range)
-                    cycle += 1
-                    state = "PUT"
-                    state_enter_ts = time.time()
+                    click(cx, cy)
                     action = "click center"
+                    if not (jitter_sleep(click_delay, click_jitter, hotkeys) or short_pause(state_pause_range, hotkeys)):
+                        set_state("PUT", "clicked")
+                        cycle += 1
+                        events.emit("cycle", cycle=cycle, duration=round(state_enter_ts - cycle_start_ts, 3))
+                        events.emit("pacing", rates=scheduler.report())
+                        if prefilter is not None:
+                            events.emit("prefilter", templates=prefilter.report())
+                        events.emit("variants", buttons={t.name: t.report() for t in (put_t, start_t, collect_t)})
+                        timeouts.save()
+                        cycle_start_ts = state_enter_ts
+
+            if recorder is not None:
+                recorder.record(frame_bgr, {"state": state, "cycle": cycle, "running": running, "action": action})
+            if renderer is not None:
+                renderer.submit(frame_bgr, hud_lines((time.perf_counter() - t0) * 1000), action, matches)
+
+            if blocked:
+                # restart the scan deadline: the blocking work above is not a (late) scan interval
+                scheduler.begin("scan")
+            else:
+                scheduler.tick("scan", (scan_interval, scan_interval), label=scan_label)
+
+    hotkeys.close()
+    timeouts.save()
+    if renderer is not None:
+        renderer.close()
+    if recorder is not None:
+        recorder.close()
+    events.close()
+
+    if batch is None:
+        return None
+    import report
+    summary = report.build_report(report.last_session(events.kept))
+    summary["batch"] = {
+        "exit_reason": exit_reason,
+        "stalled": exit_reason == "stalled",
+        "cycles": cycle,
+        "elapsed_s": round(time.monotonic() - run_start_ts, 2) if run_start_ts is not None else 0.0,
+        "limits": {"cycles": batch_cycles, "seconds": batch_seconds, "stall_seconds": batch_stall_seconds},
+    }
+    return summary
 
-            if show_window:
-                # debug overlay scores
-                p_score, p_loc, p_ok, p_reason = match_best_valid(frame_gray, put_t, topk, bright_tol, dark_tol, bg_border, bg_max_mean)
-                s_score, s_loc, s_ok, s_reason = match_best_valid(frame_gray, start_t, topk, bright_tol, dark_tol, bg_border, bg_max_mean)
-                c_score, c_loc, c_ok, c_reason = match_best_valid(frame_gray, collect_t, topk, bright_tol, dark_tol, bg_border, bg_max_mean)
-
-                def draw_box(templ, loc, score, name, ok, reason):
-                    x, y = loc
-                    cv2.rectangle(frame_bgr, (x, y), (x + templ["w"], y + templ["h"]), (0, 0, 255), 2)
-                    tag = f"{name} {score:.2f}" + ("" if ok else " !")
-                    draw_text_with_bg(frame_bgr, tag, x, max(20, y - 6), cv2.FONT_HERSHEY_SIMPLEX, 0.55, (255, 255, 255), 1)
-                    if not ok:
-                        draw_text_with_bg(frame_bgr, reason[:28], x, min(frame_bgr.shape[0] - 6, y + templ["h"] + 18),
-                                          cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 255), 1)
-
-                if p_score > 0.30:
-                    draw_box(put_t, p_loc, p_score, "put", p_ok, p_reason)
-                if s_score > 0.30:
-                    draw_box(start_t, s_loc, s_score, "start", s_ok, s_reason)
-                if c_score > 0.30:
-                    draw_box(collect_t, c_loc, c_score, "collect", c_ok, c_reason)
-
-                dt_ms = (time.time() - t0) * 1000
-                state_age = time.time() - state_enter_ts
-                hud = [
-                    f"{'RUNNING' if running else 'IDLE'} | state={state} | cycle={cycle} | dt={dt_ms:.0f}ms",
-                    f"START={start_key} | STOP={cancel_key} | exit=q | state_age={state_age:.1f}s timeout={state_timeout_seconds:.1f}s",
-                    f"points={os.path.basename(points_used)} | images_dir={os.path.basename(images_dir)}",
-                    f"thr: put={thr_put:.2f} start={thr_start:.2f} collect={thr_collect:.2f}",
-                    f"verify: retries={retries} delay={verify_delay_range[0]:.2f}-{verify_delay_range[1]:.2f}s cooldown={cooldown:.2f}s",
-                    f"pause={state_pause_range[0]:.1f}-{state_pause_range[1]:.1f}s | P={p_interval_range[0]:.1f}-{p_interval_range[1]:.1f}s | Pdur={p_duration_seconds:.0f}s",
-                    f"scores: put={p_score:.3f} start={s_score:.3f} collect={c_score:.3f}",
-                    f"action: {action}",
-                ]
-                y0 = 28
-                for i, line in enumerate(hud):
-                    draw_text_with_bg(frame_bgr, line, 12, y0 + i * 22, cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
-
-                cv2.imshow(window_name, frame_bgr)
-                if cv2.waitKey(1) & 0xFF == ord("q"):
-                    break
-
-            time.sleep(scan_interval)
-
-    if show_window:
-        cv2.destroyAllWindows()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Heartopia snow sculpture auto clicker")
+    parser.add_argument("--config", default=CONFIG_FILE, help="config file (default: config.json)")
+    parser.add_argument("--batch", action="store_true",
+                        help="start at once without the debug window and print a JSON summary on exit")
+    parser.add_argument("--cycles", type=int, default=None, help="batch: stop after N cycles")
+    parser.add_argument("--minutes", type=float, default=None, help="batch: stop after T minutes")
+    parser.add_argument("--stall-seconds", type=float, default=DEFAULT_BATCH_STALL_SECONDS,
+                        help="batch: give up (exit code 3) when no button click is verified for this long")
+    parser.add_argument("--summary", default=None, help="batch: also write the JSON summary to this file")
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    config = load_config(args.config)
+    if not (args.batch or args.cycles or args.minutes):
+        main(config)
+        sys.exit(0)
+
+    config.setdefault("debug", {})["show_window"] = False
+    batch = {
+        "cycles": args.cycles,
+        "seconds": args.minutes * 60.0 if args.minutes else None,
+        "stall_seconds": args.stall_seconds,
+    }
+    # stdout carries only the JSON summary; progress messages go to stderr
+    with contextlib.redirect_stdout(sys.stderr):
+        summary = main(config, batch=batch)
+    json.dump(summary, sys.stdout, indent=2)
+    print("")
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    sys.exit(EXIT_STALLED if summary["batch"]["stalled"] else 0)
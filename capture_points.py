@@ -1,3 +1,4 @@
+import argparse
 import json
 import os
 import time
@@ -30,6 +31,16 @@ DEFAULT_CAPTURE_INPUT = "keyboard"
 # Preview screenshot timing
 DEFAULT_PREVIEW_CAPTURE_AT_N = 4  # take base screenshot when reaching this point count
 
+# mode: "manual" (hover + hotkey) | "auto" (detect slot outlines from one frame)
+DEFAULT_CAPTURE_MODE = "manual"
+DEFAULT_AUTO_CONFIRM = True
+# Slot side length as a fraction of monitor height (slots are ~135px at 1080p)
+DEFAULT_AUTO_SLOT_MIN_FRAC = 0.07
+DEFAULT_AUTO_SLOT_MAX_FRAC = 0.20
+DEFAULT_AUTO_SIZE_TOL = 0.20
+
+AUTO_WINDOW_NAME = "Capture points (auto) - Enter=save r=redetect m=manual Esc=cancel"
+
 
 def load_config():
     if not os.path.exists(CONFIG_FILE):
@@ -116,8 +127,147 @@ def draw_marker(img_bgr, x, y, label: str):
     cv2.putText(img_bgr, label, (x + 12, y - 8), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2, cv2.LINE_AA)
 
 
+def detect_slot_centers(frame_bgr, max_points, min_frac=DEFAULT_AUTO_SLOT_MIN_FRAC,
+                        max_frac=DEFAULT_AUTO_SLOT_MAX_FRAC, size_tol=DEFAULT_AUTO_SIZE_TOL):
+    """
+    Finds the rounded-square slot outlines on the LEFT half of a frame.
+    Returns slot centers (frame-relative), ordered row by row, top-left first.
+    """
+    H, W = frame_bgr.shape[:2]
+    gray = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2GRAY)
+    edges = cv2.Canny(gray, 40, 120)
+    edges = cv2.dilate(edges, np.ones((3, 3), dtype=np.uint8))
+    contours, _ = cv2.findContours(edges, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+
+    min_side = int(H * min_frac)
+    max_side = int(H * max_frac)
+
+    boxes = []
+    for c in contours:
+        x, y, w, h = cv2.boundingRect(c)
+        if not (min_side <= w <= max_side and min_side <= h <= max_side):
+            continue
+        if not (0.8 <= w / h <= 1.25):
+            continue
+        if x + w // 2 >= W // 2:
+            continue
+        # closed outline (not a stray edge fragment)
+        if cv2.contourArea(c) < 0.6 * w * h:
+            continue
+        boxes.append((x, y, w, h))
+
+    if not boxes:
+        return []
+
+    # inner/outer edges of the same outline -> keep the largest box per center
+    boxes.sort(key=lambda b: b[2] * b[3], reverse=True)
+    side_med = float(np.median([max(b[2], b[3]) for b in boxes]))
+    merge_dist = side_med / 2
+    kept = []
+    for (x, y, w, h) in boxes:
+        cx, cy = x + w / 2, y + h / 2
+        if any(abs(cx - kx) < merge_dist and abs(cy - ky) < merge_dist for (kx, ky, _s) in kept):
+            continue
+        kept.append((cx, cy, max(w, h)))
+
+    # slots share one size; drop buttons / decorations that are off
+    side_med = float(np.median([s for (_x, _y, s) in kept]))
+    kept = [k for k in kept if abs(k[2] - side_med) <= side_med * size_tol]
+
+    # row-major order: group by y, then sort each row by x
+    kept.sort(key=lambda k: k[1])
+    rows = []
+    for k in kept:
+        if rows and abs(k[1] - rows[-1][0][1]) < side_med / 2:
+            rows[-1].append(k)
+        else:
+            rows.append([k])
+
+    centers = []
+    for row in rows:
+        for (cx, cy, _s) in sorted(row, key=lambda k: k[0]):
+            centers.append((int(round(cx)), int(round(cy))))
+    return centers[:max_points]
+
+
+def confirm_points_interactive(frame_bgr, points_rel):
+    """
+    Shows detected points for review. Left click adds a point, right click removes the nearest.
+    Returns ("save" | "redetect" | "manual" | "cancel", points_rel).
+    """
+    points = list(points_rel)
+    H, W = frame_bgr.shape[:2]
+    scale = min(1.0, 1280.0 / W)
+    base = cv2.resize(frame_bgr, (int(W * scale), int(H * scale)), interpolation=cv2.INTER_AREA) if scale < 1.0 else frame_bgr.copy()
+
+    def on_mouse(event, mx, my, _flags, _param):
+        px, py = int(mx / scale), int(my / scale)
+        if event == cv2.EVENT_LBUTTONDOWN:
+            points.append((px, py))
+        elif event == cv2.EVENT_RBUTTONDOWN and points:
+            nearest = min(range(len(points)), key=lambda i: (points[i][0] - px) ** 2 + (points[i][1] - py) ** 2)
+            points.pop(nearest)
+
+    cv2.namedWindow(AUTO_WINDOW_NAME, cv2.WINDOW_AUTOSIZE)
+    cv2.setMouseCallback(AUTO_WINDOW_NAME, on_mouse)
+    try:
+        while True:
+            view = base.copy()
+            for i, (x, y) in enumerate(points, start=1):
+                draw_marker(view, int(x * scale), int(y * scale), str(i))
+            cv2.imshow(AUTO_WINDOW_NAME, view)
+            key = cv2.waitKey(30) & 0xFF
+            if key in (13, 10, ord("s")):
+                return "save", points
+            if key == ord("r"):
+                return "redetect", points
+            if key == ord("m"):
+                return "manual", points
+            if key in (27, ord("q")):
+                return "cancel", points
+    finally:
+        cv2.destroyWindow(AUTO_WINDOW_NAME)
+
+
+def run_auto_capture(sct, monitor, monitor_index, max_points, auto_cfg, confirm, det_config):
+    """
+    Single-frame slot discovery. Returns False if the user asked to fall back to manual capture.
+    """
+    mon_left, mon_top = monitor["left"], monitor["top"]
+    mon_w, mon_h = monitor["width"], monitor["height"]
+
+    while True:
+        t0 = time.perf_counter()
+        frame_bgr = grab_monitor_bgr(sct, monitor)
+        points_rel = detect_slot_centers(frame_bgr, max_points, **auto_cfg)
+        dt_ms = (time.perf_counter() - t0) * 1000
+        print(f"[auto] Detected {len(points_rel)} slot(s) on the left side in {dt_ms:.0f}ms.")
+
+        if confirm:
+            action, points_rel = confirm_points_interactive(frame_bgr, points_rel)
+            if action == "redetect":
+                continue
+            if action == "manual":
+                return False
+            if action == "cancel":
+                print("Quit (no save).")
+                return True
+
+        if not points_rel:
+            print("[auto] No slots found. Open the sculpture minigame screen or use manual mode.")
+            return True
+
+        left_points = [(mon_left + x, mon_top + y) for (x, y) in points_rel]
+        save_outputs(
+            monitor_index, mon_left, mon_top, mon_w, mon_h,
+            0.0, max_points, "auto", None,
+            left_points, frame_bgr, det_config
+        )
+        return True
+
+
 def save_outputs(monitor_index, mon_left, mon_top, mon_w, mon_h, duration_seconds, max_points,
-                 capture_input, capture_key, left_points, base_preview_bgr):
+                 capture_input, capture_key, left_points, base_preview_bgr, det_config=None):
     right_points = [(mirror_x_in_monitor(x, mon_left, mon_w), y) for (x, y) in left_points]
 
     data = {
@@ -132,6 +282,15 @@ def save_outputs(monitor_index, mon_left, mon_top, mon_w, mon_h, duration_second
         "right_points": right_points
     }
 
+    if base_preview_bgr is not None and det_config:
+        # empty-slot colour counts: auto_snow_loop only runs the colour test where they rose
+        from auto_snow_loop import compute_slot_baselines
+        baselines = compute_slot_baselines(base_preview_bgr, mon_left, mon_top, left_points, right_points, det_config)
+        missing = sum(b is None for b in baselines["left"] + baselines["right"])
+        if missing:
+            print(f"Slot baselines: {missing} slot(s) skipped (lit or out of frame); those get the plain colour floor.")
+        data["slot_baselines"] = baselines
+
     with open(OUT_POINTS_FILE, "w", encoding="utf-8") as f:
         json.dump(data, f, indent=2)
 
@@ -153,12 +312,21 @@ def save_outputs(monitor_index, mon_left, mon_top, mon_w, mon_h, duration_second
         print("Preview not saved (no base screenshot was captured).")
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Capture slot center points into points.json")
+    parser.add_argument("--auto", action="store_true", help="detect slots automatically from one frame")
+    parser.add_argument("--no-confirm", action="store_true", help="auto mode: save without the review window")
+    return parser.parse_args()
+
+
 def main():
+    args = parse_args()
     config = load_config()
 
     monitor_index = int(config["monitor"]["index"])
 
     cap_cfg = config.get("capture_points", {})
+    det_config = config.get("detection", {})
     duration_seconds = float(cap_cfg.get("duration_seconds", DEFAULT_DURATION_SECONDS))
     max_points = int(cap_cfg.get("max_points", DEFAULT_MAX_POINTS))
 
@@ -172,6 +340,29 @@ def main():
     preview_capture_at_n = int(cap_cfg.get("preview_capture_at_n", DEFAULT_PREVIEW_CAPTURE_AT_N))
     preview_capture_at_n = max(1, min(preview_capture_at_n, max_points))
 
+    capture_mode = "auto" if args.auto else str(cap_cfg.get("mode", DEFAULT_CAPTURE_MODE)).lower().strip()
+    auto_confirm = bool(cap_cfg.get("auto_confirm", DEFAULT_AUTO_CONFIRM)) and not args.no_confirm
+    auto_cfg = {
+        "min_frac": float(cap_cfg.get("auto_slot_min_frac", DEFAULT_AUTO_SLOT_MIN_FRAC)),
+        "max_frac": float(cap_cfg.get("auto_slot_max_frac", DEFAULT_AUTO_SLOT_MAX_FRAC)),
+        "size_tol": float(cap_cfg.get("auto_size_tol", DEFAULT_AUTO_SIZE_TOL)),
+    }
+
+    if capture_mode == "auto":
+        with mss() as sct:
+            mon_left, mon_top, mon_w, mon_h = pick_monitor_rect(sct, monitor_index)
+            monitor = {"left": mon_left, "top": mon_top, "width": mon_w, "height": mon_h}
+            print("")
+            print("=== Auto Point Capture (single frame) ===")
+            print("")
+            if auto_confirm:
+                print("Review window: Enter=save | r=re-detect | m=manual capture | Esc=cancel")
+                print("Left click adds a point, right click removes the nearest one.")
+                print("")
+            if run_auto_capture(sct, monitor, monitor_index, max_points, auto_cfg, auto_confirm, det_config):
+                return
+        print("Switching to manual capture.")
+
     start_vk = vk_from_key(start_key)
     capture_vk = vk_from_key(capture_key)
     save_vk = vk_from_key(save_key)
@@ -251,7 +442,7 @@ def main():
                 save_outputs(
                     monitor_index, mon_left, mon_top, mon_w, mon_h,
                     duration_seconds, max_points, capture_input, capture_key,
-                    left_points, base_preview_bgr
+                    left_points, base_preview_bgr, det_config
                 )
                 capturing = False
                 print(f"Done. Press {start_key} to capture again, or {quit_key} to quit.")
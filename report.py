@@ -0,0 +1,349 @@
+import argparse
+import json
+import os
+import re
+import sys
+
+DEFAULT_EVENTS_FILE = "events.jsonl"
+
+STATE_ORDER = ["PUT", "START", "P_RUN", "COLLECT", "CENTER"]
+
+
+def load_events(path):
+    if not os.path.exists(path):
+        raise RuntimeError(f"Events file not found: {path} (run auto_snow_loop.py first)")
+
+    events = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                events.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue  # partially written last line
+    return events
+
+
+def last_session(events):
+    starts = [i for i, e in enumerate(events) if e.get("event") == "session_start"]
+    return events[starts[-1]:] if starts else events
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    v = sorted(values)
+    k = (len(v) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(v) - 1)
+    return v[lo] + (v[hi] - v[lo]) * (k - lo)
+
+
+def build_report(events):
+    states = {}
+    appear = {}  # state -> latencies (state entered -> button detected)
+    clicks = {}
+    cycle_durations = []
+    p_rounds = 0
+    p_matches = 0
+    p_ends = {}
+    p_saved = []
+    slot_hits = {}
+    slots = 0
+    pacing_sessions = []  # last "pacing" snapshot of each session (cumulative within a session)
+    prefilter_sessions = []  # same for "prefilter"
+    variant_sessions = []  # same for "variants"
+    startups = []  # "startup" traces, one per session
+    first_clicks = []  # run start -> first click (ms)
+
+    for e in events:
+        kind = e.get("event")
+
+        if kind == "session_start":
+            slots = max(slots, int(e.get("slots", 0)))
+            pacing_sessions.append({})
+            prefilter_sessions.append({})
+            variant_sessions.append({})
+
+        elif kind == "pacing":
+            if not pacing_sessions:
+                pacing_sessions.append({})
+            pacing_sessions[-1] = e.get("rates", {})
+
+        elif kind == "prefilter":
+            if not prefilter_sessions:
+                prefilter_sessions.append({})
+            prefilter_sessions[-1] = e.get("templates", {})
+
+        elif kind == "variants":
+            if not variant_sessions:
+                variant_sessions.append({})
+            variant_sessions[-1] = e.get("buttons", {})
+
+        elif kind == "startup":
+            startups.append(e)
+
+        elif kind == "first_click":
+            if e.get("run_ms") is not None:
+                first_clicks.append(float(e["run_ms"]))
+
+        elif kind == "state_exit":
+            st = states.setdefault(e["state"], {"time": 0.0, "exits": 0, "timeouts": 0, "durations": [], "timeout_s": None})
+            st["time"] += float(e.get("duration", 0.0))
+            if "timeout" in e:
+                st["timeout_s"] = float(e["timeout"])
+            st["exits"] += 1
+            st["durations"].append(float(e.get("duration", 0.0)))
+            if e.get("outcome") == "timeout":
+                st["timeouts"] += 1
+
+        elif kind == "appear":
+            appear.setdefault(e["state"], []).append(float(e.get("latency", 0.0)))
+
+        elif kind == "click":
+            c = clicks.setdefault(e["state"], {"attempts": 0, "ok": 0, "exhausted": 0, "tries": []})
+            c["attempts"] += 1
+            if e.get("ok"):
+                c["ok"] += 1
+                m = re.search(r"try=(\d+)", e.get("note", ""))
+                if m:
+                    c["tries"].append(int(m.group(1)))
+            elif e.get("note") == "retries_exhausted":
+                c["exhausted"] += 1
+
+        elif kind == "p_round":
+            p_rounds += 1
+            hits = e.get("hits", [])
+            p_matches += len(hits)
+            for i in hits:
+                slot_hits[i] = slot_hits.get(i, 0) + 1
+
+        elif kind == "p_done":
+            end = e.get("end", "duration")
+            p_ends[end] = p_ends.get(end, 0) + 1
+            p_saved.append(float(e.get("saved", 0.0)))
+
+        elif kind == "cycle":
+            cycle_durations.append(float(e.get("duration", 0.0)))
+
+    running_seconds = sum(st["time"] for st in states.values())
+    cycles = len(cycle_durations)
+
+    state_rows = {}
+    for name in sorted(states, key=lambda n: STATE_ORDER.index(n) if n in STATE_ORDER else len(STATE_ORDER)):
+        st = states[name]
+        state_rows[name] = {
+            "time_s": round(st["time"], 2),
+            "share": round(st["time"] / running_seconds, 4) if running_seconds else 0.0,
+            "exits": st["exits"],
+            "timeouts": st["timeouts"],
+            "timeout_rate": round(st["timeouts"] / st["exits"], 4) if st["exits"] else 0.0,
+            "mean_s": round(st["time"] / st["exits"], 3) if st["exits"] else 0.0,
+            "p90_s": round(percentile(st["durations"], 0.90), 3),
+            "appear_n": len(appear.get(name, [])),
+            "appear_p50_s": round(percentile(appear.get(name, []), 0.50), 3),
+            "appear_p90_s": round(percentile(appear.get(name, []), 0.90), 3),
+            "timeout_s": st["timeout_s"],  # timeout in effect at the last exit
+        }
+
+    click_rows = {}
+    for name, c in clicks.items():
+        click_rows[name] = {
+            "attempts": c["attempts"],
+            "ok": c["ok"],
+            "retries_exhausted": c["exhausted"],
+            "mean_tries": round(sum(c["tries"]) / len(c["tries"]), 2) if c["tries"] else 0.0,
+        }
+
+    n_slots = max(slots, (max(slot_hits) + 1) if slot_hits else 0)
+    slot_rows = [
+        {"slot": i, "hits": slot_hits.get(i, 0), "hit_rate": round(slot_hits.get(i, 0) / p_rounds, 4) if p_rounds else 0.0}
+        for i in range(n_slots)
+    ]
+
+    pacing_sums = {}
+    for rates in pacing_sessions:
+        for label, r in rates.items():
+            p = pacing_sums.setdefault(label, {"n": 0, "target_s": 0.0, "achieved_s": 0.0, "late": 0})
+            for k in p:
+                p[k] += r.get(k, 0)
+    pacing_rows = {}
+    for label, p in pacing_sums.items():
+        if p["n"] and p["target_s"] > 0 and p["achieved_s"] > 0:
+            target_hz = p["n"] / p["target_s"]
+            achieved_hz = p["n"] / p["achieved_s"]
+            pacing_rows[label] = {
+                "ticks": p["n"],
+                "target_hz": round(target_hz, 3),
+                "achieved_hz": round(achieved_hz, 3),
+                "gap_pct": round((achieved_hz - target_hz) / target_hz * 100.0, 1),
+                "late": p["late"],
+            }
+
+    prefilter_sums = {}
+    for templates in prefilter_sessions:
+        for name, t in templates.items():
+            p = prefilter_sums.setdefault(name, {"checks": 0, "rejects": 0, "audits": 0, "false_rejects": 0, "searched": 0.0})
+            for k in p:
+                p[k] += t.get(k, 0)
+    prefilter_rows = {}
+    for name, p in prefilter_sums.items():
+        passed = p["checks"] - p["rejects"]
+        prefilter_rows[name] = {
+            "checks": p["checks"],
+            "reject_rate": round(p["rejects"] / p["checks"], 4) if p["checks"] else 0.0,
+            "audits": p["audits"],
+            "false_rejects": p["false_rejects"],
+            "false_reject_rate": round(p["false_rejects"] / p["audits"], 4) if p["audits"] else 0.0,
+            "searched_share": round(p["searched"] / passed, 4) if passed else 0.0,
+        }
+
+    variant_sums = {}
+    for buttons in variant_sessions:
+        for button, variants in buttons.items():
+            for name, v in variants.items():
+                p = variant_sums.setdefault(button, {}).setdefault(name, {"tries": 0, "hits": 0})
+                p["tries"] += v.get("tries", 0)
+                p["hits"] += v.get("hits", 0)
+    variant_rows = {}
+    for button, variants in variant_sums.items():
+        total_hits = sum(v["hits"] for v in variants.values())
+        variant_rows[button] = {
+            name: {
+                "tries": v["tries"],
+                "hits": v["hits"],
+                "hit_share": round(v["hits"] / total_hits, 4) if total_hits else 0.0,
+            }
+            for name, v in variants.items()
+        }
+
+    ready = [float(e.get("total_ms", 0.0)) for e in startups]
+    startup = {
+        "sessions": len(startups),
+        "ready_p50_ms": round(percentile(ready, 0.50), 1),
+        "first_click_p50_ms": round(percentile(first_clicks, 0.50), 1),
+        "last_phases_ms": startups[-1].get("phases_ms", {}) if startups else {},
+        "last_parallel_ms": startups[-1].get("parallel_ms", {}) if startups else {},
+    }
+
+    return {
+        "running_seconds": round(running_seconds, 2),
+        "cycles": cycles,
+        "cycles_per_hour": round(cycles * 3600.0 / running_seconds, 2) if running_seconds else 0.0,
+        "cycle_mean_s": round(sum(cycle_durations) / cycles, 2) if cycles else 0.0,
+        "cycle_p90_s": round(percentile(cycle_durations, 0.90), 2),
+        "states": state_rows,
+        "clicks": click_rows,
+        "p_run": {
+            "rounds": p_rounds,
+            "matches": p_matches,
+            "matches_per_round": round(p_matches / p_rounds, 3) if p_rounds else 0.0,
+            "slots": slot_rows,
+            "ends": p_ends,
+            "saved_s_total": round(sum(p_saved), 2),
+            "saved_s_mean": round(sum(p_saved) / len(p_saved), 3) if p_saved else 0.0,
+        },
+        "pacing": pacing_rows,
+        "prefilter": prefilter_rows,
+        "variants": variant_rows,
+        "startup": startup,
+    }
+
+
+def print_report(rep):
+    print("")
+    print("=== Throughput report ===")
+    print("")
+    print(f"Running time : {rep['running_seconds'] / 60:.1f} min")
+    print(f"Cycles       : {rep['cycles']}  ({rep['cycles_per_hour']:.1f}/h)")
+    print(f"Cycle time   : mean={rep['cycle_mean_s']:.1f}s  p90={rep['cycle_p90_s']:.1f}s")
+    print("")
+    print(f"{'state':<8} {'time':>9} {'share':>7} {'exits':>6} {'timeouts':>9} {'rate':>6} {'mean':>7} {'p90':>7}")
+    for name, st in rep["states"].items():
+        print(f"{name:<8} {st['time_s']:>8.1f}s {st['share'] * 100:>6.1f}% {st['exits']:>6} "
+              f"{st['timeouts']:>9} {st['timeout_rate'] * 100:>5.1f}% {st['mean_s']:>6.2f}s {st['p90_s']:>6.2f}s")
+
+    appear_rows = {name: st for name, st in rep["states"].items() if st.get("appear_n")}
+    if appear_rows:
+        print("")
+        print(f"{'appear':<8} {'n':>5} {'p50':>7} {'p90':>7} {'timeout':>8}")
+        for name, st in appear_rows.items():
+            timeout = f"{st['timeout_s']:.2f}s" if st.get("timeout_s") is not None else "-"
+            print(f"{name:<8} {st['appear_n']:>5} {st['appear_p50_s']:>6.2f}s {st['appear_p90_s']:>6.2f}s {timeout:>8}")
+
+    if rep["clicks"]:
+        print("")
+        print(f"{'click':<8} {'attempts':>9} {'ok':>5} {'exhausted':>10} {'tries':>6}")
+        for name, c in rep["clicks"].items():
+            print(f"{name:<8} {c['attempts']:>9} {c['ok']:>5} {c['retries_exhausted']:>10} {c['mean_tries']:>6.2f}")
+
+    if rep["pacing"]:
+        print("")
+        print(f"{'pacing':<8} {'ticks':>7} {'target':>9} {'achieved':>9} {'gap':>7} {'late':>5}")
+        for name, r in rep["pacing"].items():
+            print(f"{name:<8} {r['ticks']:>7} {r['target_hz']:>7.2f}Hz {r['achieved_hz']:>7.2f}Hz "
+                  f"{r['gap_pct']:>6.1f}% {r['late']:>5}")
+
+    if rep.get("prefilter"):
+        print("")
+        print(f"{'prefilter':<22} {'checks':>7} {'rejected':>9} {'audits':>7} {'false':>6} {'searched':>9}")
+        for name, r in rep["prefilter"].items():
+            print(f"{name:<22} {r['checks']:>7} {r['reject_rate'] * 100:>8.1f}% {r['audits']:>7} "
+                  f"{r['false_reject_rate'] * 100:>5.1f}% {r['searched_share'] * 100:>8.1f}%")
+
+    multi = {button: v for button, v in rep.get("variants", {}).items() if len(v) > 1}
+    if multi:
+        print("")
+        print(f"{'variant':<36} {'tries':>7} {'hits':>6} {'share':>7}")
+        for button, variants in multi.items():
+            for name, v in variants.items():
+                print(f"{name:<36} {v['tries']:>7} {v['hits']:>6} {v['hit_share'] * 100:>6.1f}%")
+
+    startup = rep.get("startup", {})
+    if startup.get("sessions"):
+        print("")
+        phases = " ".join(f"{k}={v:.0f}ms" for k, v in startup["last_phases_ms"].items())
+        print(f"Startup      : ready p50={startup['ready_p50_ms']:.0f}ms  first click p50={startup['first_click_p50_ms']:.0f}ms "
+              f"after START ({startup['sessions']} session(s))")
+        print(f"  last       : {phases}")
+
+    p = rep["p_run"]
+    print("")
+    print(f"P_RUN rounds={p['rounds']} matches={p['matches']} ({p['matches_per_round']:.2f}/round)")
+    if p["ends"]:
+        ends = " ".join(f"{k}={v}" for k, v in sorted(p["ends"].items()))
+        print(f"P_RUN ends: {ends} | saved vs p_duration_seconds: mean={p['saved_s_mean']:.1f}s/cycle "
+              f"total={p['saved_s_total']:.0f}s")
+    if p["slots"]:
+        print("Hit rate per slot (hits / rounds):")
+        for row in p["slots"]:
+            print(f"  slot {row['slot'] + 1:>2}: {row['hit_rate'] * 100:5.1f}%  ({row['hits']})")
+    print("")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Summarize auto_snow_loop.py event logs")
+    parser.add_argument("events_file", nargs="?", default=DEFAULT_EVENTS_FILE)
+    parser.add_argument("--last", action="store_true", help="only the most recent session")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    events = load_events(args.events_file)
+    if args.last:
+        events = last_session(events)
+
+    rep = build_report(events)
+    if args.json:
+        json.dump(rep, sys.stdout, indent=2)
+        print("")
+    else:
+        print_report(rep)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,433 @@
+import argparse
+import copy
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import cv2
+import numpy as np
+
+import auto_snow_loop
+import report
+
+CONFIG_FILE = "config.json"
+POINTS_FILE = "points.json"
+
+DEFAULT_WIDTH = 1920
+DEFAULT_HEIGHT = 1080
+DEFAULT_MINUTES = 2.0
+DEFAULT_SPEED = 1.0
+DEFAULT_NOISE = 4             # +/- per channel
+DEFAULT_ICON_OFFSET = 40      # max px the buttons move between appearances
+DEFAULT_UI_DELAY = (0.10, 0.35)
+DEFAULT_SLOT_SPAWN = (0.4, 1.2)   # seconds between slots lighting up
+DEFAULT_SLOT_LIT_SECONDS = 2.5    # a lit slot goes dark again if not clicked
+DEFAULT_GAME_FRACTION = 0.9       # minigame length as a fraction of p_duration_seconds
+SLOT_STYLES = ("fill", "markers")  # lit slot: filled disc/ring, or a few small dots (~1% of the box lit)
+MARKER_DOTS = 8                    # dots per colour in "markers" style
+
+# Button anchors (fraction of the screen); each appearance adds a random offset
+ICON_ANCHORS = {"put": (0.50, 0.82), "start": (0.50, 0.86), "collect": (0.50, 0.78)}
+ICON_FILES = {"put": "put-snow.png", "start": "start-snow.png", "collect": "collect-sculture.png"}
+NEXT_SCREEN = {"put": "start", "start": "minigame", "collect": "result"}
+
+# Timing keys in config.json -> automation that get divided by --speed
+SPEED_SCALED_KEYS = ["state_pause_range", "p_interval_range", "p_duration_seconds", "p_settle_seconds",
+                     "state_timeout_seconds", "timeout_min_seconds", "timeout_max_seconds",
+                     "verify_delay_range", "icon_cooldown"]
+
+
+def load_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_icon_bgra(path):
+    img = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if img is None:
+        raise RuntimeError(f"Failed to read template: {path}")
+    if img.ndim == 2:
+        img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGRA)
+    elif img.shape[2] == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2BGRA)
+    return img
+
+
+def percentile(values, q):
+    return round(report.percentile(values, q), 4)
+
+
+def summarize_latency(values):
+    if not values:
+        return {"n": 0, "mean_s": 0.0, "p50_s": 0.0, "p90_s": 0.0}
+    return {
+        "n": len(values),
+        "mean_s": round(sum(values) / len(values), 4),
+        "p50_s": percentile(values, 0.50),
+        "p90_s": percentile(values, 0.90),
+    }
+
+
+class SimGame:
+    """
+    Headless stand-in for the game screen.
+
+    Screens: put -> start -> minigame -> collect -> result -> put. Clicking a button starts a UI
+    transition (blank screen for `ui_delay`), the minigame lights slots with color_1/color_2 at the
+    points.json coordinates, and the result screen waits for a click anywhere (the CENTER state).
+    Time only advances when the loop grabs a frame or clicks, so no thread is needed.
+    """
+
+    def __init__(self, width, height, images_dir, points, det_config, game_seconds, speed=1.0,
+                 noise=DEFAULT_NOISE, icon_offset=DEFAULT_ICON_OFFSET, ui_delay=DEFAULT_UI_DELAY,
+                 slot_spawn=DEFAULT_SLOT_SPAWN, slot_lit_seconds=DEFAULT_SLOT_LIT_SECONDS, slot_style="fill", seed=None):
+        self.W, self.H = int(width), int(height)
+        self.points = [(int(x), int(y)) for (x, y) in points]
+        self.det = det_config
+        self.game_seconds = float(game_seconds)
+        self.icon_offset = int(icon_offset)
+        self.ui_delay = (ui_delay[0] / speed, ui_delay[1] / speed)
+        self.slot_spawn = (slot_spawn[0] / speed, slot_spawn[1] / speed)
+        self.slot_lit_seconds = slot_lit_seconds / speed
+        if slot_style not in SLOT_STYLES:
+            raise RuntimeError(f"Unknown slot_style: {slot_style}")
+        self.slot_style = slot_style
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+        self.icons = {name: load_icon_bgra(os.path.join(images_dir, f)) for name, f in ICON_FILES.items()}
+        self.background = self._make_background()
+        nrng = np.random.default_rng(seed)
+        self.noise = [nrng.integers(-noise, noise + 1, size=(self.H, self.W, 1), dtype=np.int16) for _ in range(4)] if noise > 0 else []
+        self.frame_no = 0
+
+        self.screen = "put"
+        self.screen_ts = time.monotonic()
+        self.icon_pos = None
+        self.pending = None           # (ready_ts, next_screen) during a UI transition
+        self.lit = {}                 # slot index -> lit_ts
+        self.next_spawn_ts = 0.0
+        self.game_end_ts = 0.0
+        self._place_icon()
+
+        self.stats = {
+            "cycles": 0,
+            "icon_latency": {name: [] for name in ICON_FILES},
+            "center_latency": [],
+            "slot_latency": [],
+            "slots_spawned": 0,
+            "slots_hit": 0,
+            "slots_missed": 0,
+            "clicks": 0,
+            "stray_clicks": 0,
+        }
+
+    # --- rendering ---
+
+    def _make_background(self):
+        bg = np.zeros((self.H, self.W, 3), dtype=np.uint8)
+        bg[:] = (38, 32, 36)
+        box = int(self.det.get("color_box", 70))
+        side = max(box + 20, int(self.H * 0.125))
+        for (x, y) in self.points:
+            p1 = (x - side // 2, y - side // 2)
+            p2 = (x + side // 2, y + side // 2)
+            cv2.rectangle(bg, p1, p2, (120, 116, 118), 2, cv2.LINE_AA)
+        return bg
+
+    def _place_icon(self):
+        if self.screen not in ICON_ANCHORS:
+            self.icon_pos = None
+            return
+        icon = self.icons[self.screen]
+        h, w = icon.shape[:2]
+        fx, fy = ICON_ANCHORS[self.screen]
+        x = int(self.W * fx) - w // 2 + self.rng.randint(-self.icon_offset, self.icon_offset)
+        y = int(self.H * fy) - h // 2 + self.rng.randint(-self.icon_offset, self.icon_offset)
+        self.icon_pos = (max(0, min(self.W - w, x)), max(0, min(self.H - h, y)))
+
+    def _draw_icon(self, frame):
+        icon = self.icons[self.screen]
+        h, w = icon.shape[:2]
+        x, y = self.icon_pos
+        roi = frame[y:y + h, x:x + w].astype(np.float32)
+        alpha = icon[:, :, 3:4].astype(np.float32) / 255.0
+        frame[y:y + h, x:x + w] = (icon[:, :, :3] * alpha + roi * (1.0 - alpha)).astype(np.uint8)
+
+    def _draw_lit_slot(self, frame, x, y):
+        r1, g1, b1 = self.det["color_1"]
+        r2, g2, b2 = self.det["color_2"]
+        box = int(self.det.get("color_box", 70))
+        if self.slot_style == "markers":
+            # just enough separated 2x2 dots of each colour for color_hit, on the dark slot
+            for k in range(MARKER_DOTS):
+                a = 2.0 * np.pi * k / MARKER_DOTS
+                for radius, color in ((0.18, (b1, g1, r1)), (0.36, (b2, g2, r2))):
+                    dx, dy = int(np.cos(a) * box * radius), int(np.sin(a) * box * radius)
+                    cv2.rectangle(frame, (x + dx, y + dy), (x + dx + 1, y + dy + 1), color, -1)
+            return
+        cv2.rectangle(frame, (x - box // 2, y - box // 2), (x + box // 2, y + box // 2), (205, 214, 222), -1)
+        cv2.circle(frame, (x, y), int(box * 0.32), (b2, g2, r2), max(2, box // 16))
+        cv2.circle(frame, (x, y), int(box * 0.14), (b1, g1, r1), -1)
+
+    def render(self):
+        frame = self.background.copy()
+        if self.pending is None:
+            if self.icon_pos is not None:
+                self._draw_icon(frame)
+            elif self.screen == "minigame":
+                for i in self.lit:
+                    self._draw_lit_slot(frame, *self.points[i])
+        if self.noise:
+            n = self.noise[self.frame_no % len(self.noise)]
+            frame = np.clip(frame.astype(np.int16) + n, 0, 255).astype(np.uint8)
+        self.frame_no += 1
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA)
+
+    # --- game logic ---
+
+    def _set_screen(self, screen, now):
+        self.screen = screen
+        self.screen_ts = now
+        self.pending = None
+        self._place_icon()
+        if screen == "minigame":
+            self.lit = {}
+            self.game_end_ts = now + self.game_seconds
+            self.next_spawn_ts = now + self.rng.uniform(*self.slot_spawn)
+
+    def advance(self, now):
+        if self.pending is not None and now >= self.pending[0]:
+            self._set_screen(self.pending[1], now)
+
+        if self.screen != "minigame" or self.pending is not None:
+            return
+
+        for i, ts in list(self.lit.items()):
+            if now - ts > self.slot_lit_seconds:
+                del self.lit[i]
+                self.stats["slots_missed"] += 1
+
+        while now >= self.next_spawn_ts and self.next_spawn_ts < self.game_end_ts:
+            dark = [i for i in range(len(self.points)) if i not in self.lit]
+            if dark:
+                self.lit[self.rng.choice(dark)] = self.next_spawn_ts
+                self.stats["slots_spawned"] += 1
+            self.next_spawn_ts += self.rng.uniform(*self.slot_spawn)
+
+        if now >= self.game_end_ts:
+            self.stats["slots_missed"] += len(self.lit)
+            self.lit = {}
+            self._set_screen("collect", now)
+
+    def grab(self):
+        with self.lock:
+            self.advance(time.monotonic())
+            return self.render()
+
+    def click(self, x, y):
+        with self.lock:
+            now = time.monotonic()
+            self.advance(now)
+            self.stats["clicks"] += 1
+            if self.pending is not None:
+                self.stats["stray_clicks"] += 1
+                return
+
+            if self.icon_pos is not None:
+                icon = self.icons[self.screen]
+                ix, iy = self.icon_pos
+                if ix <= x < ix + icon.shape[1] and iy <= y < iy + icon.shape[0]:
+                    self.stats["icon_latency"][self.screen].append(now - self.screen_ts)
+                    self.pending = (now + self.rng.uniform(*self.ui_delay), NEXT_SCREEN[self.screen])
+                else:
+                    self.stats["stray_clicks"] += 1
+
+            elif self.screen == "minigame":
+                half = int(self.det.get("color_box", 70)) // 2
+                for i, ts in list(self.lit.items()):
+                    px, py = self.points[i]
+                    if abs(px - x) <= half and abs(py - y) <= half:
+                        del self.lit[i]
+                        self.stats["slots_hit"] += 1
+                        self.stats["slot_latency"].append(now - ts)
+                        return
+                self.stats["stray_clicks"] += 1
+
+            elif self.screen == "result":
+                self.stats["center_latency"].append(now - self.screen_ts)
+                self.stats["cycles"] += 1
+                self.pending = (now + self.rng.uniform(*self.ui_delay), "put")
+
+
+class SimScreen:
+    """mss-compatible screen source backed by a SimGame (what auto_snow_loop.main grabs from)."""
+
+    def __init__(self, game):
+        self.game = game
+        mon = {"left": 0, "top": 0, "width": game.W, "height": game.H}
+        self.monitors = [mon, mon]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def grab(self, monitor):
+        return self.game.grab()
+
+
+def scaled_points(points_data, width, height):
+    rect = points_data.get("monitor_rect") or {}
+    src_w = int(points_data.get("screen_width") or rect.get("width") or DEFAULT_WIDTH)
+    src_h = int(points_data.get("screen_height") or rect.get("height") or DEFAULT_HEIGHT)
+    src_left = int(rect.get("left", 0))
+    src_top = int(rect.get("top", 0))
+
+    def conv(pts):
+        return [(int(round((x - src_left) * width / src_w)), int(round((y - src_top) * height / src_h))) for (x, y) in pts]
+
+    return conv(points_data["left_points"]), conv(points_data["right_points"])
+
+
+def build_sim_config(base_config, points_file, images_dir, events_file, timeouts_file, speed):
+    cfg = copy.deepcopy(base_config)
+    cfg.setdefault("monitor", {})["index"] = 1
+    cfg.setdefault("debug", {})["show_window"] = False
+    cfg.setdefault("recorder", {})["enabled"] = False
+    files = cfg.setdefault("files", {})
+    files["points_file"] = points_file
+    files["images_dir"] = images_dir
+    files["events_file"] = events_file
+    files["timeouts_file"] = timeouts_file
+
+    auto = cfg.setdefault("automation", {})
+    defaults = {
+        "state_pause_range": list(auto_snow_loop.DEFAULT_STATE_PAUSE_RANGE),
+        "p_interval_range": list(auto_snow_loop.DEFAULT_P_INTERVAL_RANGE),
+        "p_duration_seconds": auto_snow_loop.DEFAULT_P_DURATION_SECONDS,
+        "p_settle_seconds": auto_snow_loop.DEFAULT_P_SETTLE_SECONDS,
+        "state_timeout_seconds": auto_snow_loop.DEFAULT_STATE_TIMEOUT_SECONDS,
+        "timeout_min_seconds": auto_snow_loop.DEFAULT_TIMEOUT_MIN_SECONDS,
+        "timeout_max_seconds": auto_snow_loop.DEFAULT_TIMEOUT_MAX_SECONDS,
+        "verify_delay_range": list(auto_snow_loop.DEFAULT_VERIFY_DELAY_RANGE),
+        "icon_cooldown": auto_snow_loop.DEFAULT_ICON_COOLDOWN,
+    }
+    for key in SPEED_SCALED_KEYS:
+        v = auto.get(key, defaults[key])
+        auto[key] = [x / speed for x in v] if isinstance(v, list) else v / speed
+    return cfg
+
+
+def run_simulation(minutes, width, height, speed, noise, icon_offset, ui_delay, game_fraction, seed, slot_style="fill"):
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    base_config = load_json(os.path.join(base_dir, CONFIG_FILE))
+    points_data = load_json(os.path.join(base_dir, POINTS_FILE))
+    images_dir = os.path.join(base_dir, base_config.get("files", {}).get("images_dir", "images"))
+
+    left, right = scaled_points(points_data, width, height)
+
+    with tempfile.TemporaryDirectory(prefix="snow-sim-") as tmp:
+        points_file = os.path.join(tmp, "points.json")
+        events_file = os.path.join(tmp, "events.jsonl")
+        timeouts_file = os.path.join(tmp, "state_timeouts.json")  # learned timeouts don't leak into the real ones
+
+        cfg = build_sim_config(base_config, points_file, images_dir, events_file, timeouts_file, speed)
+        game = SimGame(
+            width, height, images_dir, left + right, cfg["detection"],
+            game_seconds=cfg["automation"]["p_duration_seconds"] * game_fraction, speed=speed,
+            noise=noise, icon_offset=icon_offset, ui_delay=ui_delay, slot_style=slot_style, seed=seed,
+        )
+        # recorded from the empty board, like capture_points.py does
+        baselines = auto_snow_loop.compute_slot_baselines(game.background, 0, 0, left, right, cfg["detection"])
+        with open(points_file, "w", encoding="utf-8") as f:
+            json.dump({"monitor_rect": {"left": 0, "top": 0, "width": width, "height": height},
+                       "left_points": left, "right_points": right, "slot_baselines": baselines}, f)
+        run_seconds = minutes * 60.0
+        source = auto_snow_loop.ScriptedHotkeySource([(0.0, "start"), (run_seconds, "quit")])
+
+        t0 = time.monotonic()
+        auto_snow_loop.main(config=cfg, sct_factory=lambda: SimScreen(game), click=game.click, hotkey_source=source)
+        elapsed = time.monotonic() - t0
+
+        loop_report = report.build_report(report.load_events(events_file))
+
+    st = game.stats
+    sim_hours = elapsed * speed / 3600.0
+    return {
+        "resolution": [width, height],
+        "speed": speed,
+        "elapsed_s": round(elapsed, 2),
+        "cycles": st["cycles"],
+        "cycles_per_hour": round(st["cycles"] / sim_hours, 2) if sim_hours > 0 else 0.0,
+        "icon_latency": {name: summarize_latency(v) for name, v in st["icon_latency"].items()},
+        "center_latency": summarize_latency(st["center_latency"]),
+        "slot_latency": summarize_latency(st["slot_latency"]),
+        "slots": {
+            "spawned": st["slots_spawned"],
+            "hit": st["slots_hit"],
+            "missed": st["slots_missed"],
+            "hit_ratio": round(st["slots_hit"] / st["slots_spawned"], 4) if st["slots_spawned"] else 0.0,
+        },
+        "clicks": st["clicks"],
+        "stray_clicks": st["stray_clicks"],
+        "loop": loop_report,
+    }
+
+
+def print_summary(res):
+    print("")
+    print("=== Simulation ===")
+    print("")
+    w, h = res["resolution"]
+    print(f"Resolution   : {w}x{h}  speed=x{res['speed']:g}  elapsed={res['elapsed_s']:.0f}s")
+    print(f"Cycles       : {res['cycles']}  ({res['cycles_per_hour']:.1f}/h simulated)")
+    print("Detection latency (button shown -> clicked):")
+    for name, lat in res["icon_latency"].items():
+        print(f"  {name:<8} n={lat['n']:<4} mean={lat['mean_s']:.3f}s p90={lat['p90_s']:.3f}s")
+    sl = res["slot_latency"]
+    print(f"  {'slot':<8} n={sl['n']:<4} mean={sl['mean_s']:.3f}s p90={sl['p90_s']:.3f}s")
+    s = res["slots"]
+    print(f"Slots        : spawned={s['spawned']} hit={s['hit']} missed={s['missed']} ({s['hit_ratio'] * 100:.1f}%)")
+    print(f"Clicks       : {res['clicks']} (stray={res['stray_clicks']})")
+    report.print_report(res["loop"])
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Headless end-to-end simulation of auto_snow_loop.py")
+    parser.add_argument("--minutes", type=float, default=DEFAULT_MINUTES, help="wall-clock run time")
+    parser.add_argument("--width", type=int, default=DEFAULT_WIDTH)
+    parser.add_argument("--height", type=int, default=DEFAULT_HEIGHT)
+    parser.add_argument("--speed", type=float, default=DEFAULT_SPEED,
+                        help="divide all configured/game durations by this (detection cost is not scaled)")
+    parser.add_argument("--noise", type=int, default=DEFAULT_NOISE, help="+/- pixel noise per channel")
+    parser.add_argument("--icon-offset", type=int, default=DEFAULT_ICON_OFFSET, help="max button jitter in px")
+    parser.add_argument("--ui-delay", type=float, nargs=2, default=list(DEFAULT_UI_DELAY), metavar=("MIN", "MAX"))
+    parser.add_argument("--game-fraction", type=float, default=DEFAULT_GAME_FRACTION,
+                        help="minigame length as a fraction of p_duration_seconds")
+    parser.add_argument("--slot-style", choices=SLOT_STYLES, default="fill",
+                        help="how lit slots are drawn (markers = a few small dots, for the dark-slot skip)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    res = run_simulation(
+        args.minutes, args.width, args.height, args.speed, args.noise, args.icon_offset,
+        tuple(args.ui_delay), args.game_fraction, args.seed, args.slot_style,
+    )
+    if args.json:
+        json.dump(res, sys.stdout, indent=2)
+        print("")
+    else:
+        print_summary(res)
+
+
+if __name__ == "__main__":
+    main()
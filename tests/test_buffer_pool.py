@@ -0,0 +1,76 @@
+import os
+import sys
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import auto_snow_loop  # noqa: E402
+import simulator  # noqa: E402
+
+WIDTH, HEIGHT = 1280, 720
+# a 1280x720 BGR frame is 2.7 MB; the hot path must stay far below one frame
+MAX_PEAK_BYTES = 256 * 1024
+
+
+class StaticScreen:
+    """mss-like source that returns the same BGRA screenshot on every grab."""
+
+    def __init__(self, frame_bgra):
+        self.frame_bgra = frame_bgra
+
+    def grab(self, monitor):
+        return self.frame_bgra
+
+
+def test_steady_state_iteration_allocates_almost_nothing():
+    config = auto_snow_loop.load_config(os.path.join(ROOT, auto_snow_loop.CONFIG_FILE))
+    det = config["detection"]
+    auto = config.get("automation", {})
+    images_dir = os.path.join(ROOT, "images")
+    left, right = simulator.scaled_points(simulator.load_json(os.path.join(ROOT, simulator.POINTS_FILE)), WIDTH, HEIGHT)
+    points = left + right
+
+    game = simulator.SimGame(WIDTH, HEIGHT, images_dir, points, det, game_seconds=10.0, icon_offset=0, seed=0)
+    screen = StaticScreen(game.render())  # "put" screen: the PUT button is visible
+    monitor = {"left": 0, "top": 0, "width": WIDTH, "height": HEIGHT}
+
+    templ_kwargs = {
+        "mask_mode": auto.get("mask_mode", "auto"),
+        "white_cutoff": int(auto.get("white_cutoff", auto_snow_loop.DEFAULT_WHITE_CUTOFF)),
+        "bright_thr": int(auto.get("bright_thr", auto_snow_loop.DEFAULT_BRIGHT_THR)),
+        "dark_thr": int(auto.get("dark_thr", auto_snow_loop.DEFAULT_DARK_THR)),
+    }
+    buttons = [auto_snow_loop.load_icon_variants(images_dir, name, **templ_kwargs)
+               for name in ("put-snow", "start-snow", "collect-sculture")]
+    match_args = (
+        int(auto.get("topk_tries", auto_snow_loop.DEFAULT_TOPK_TRIES)),
+        float(auto.get("bright_tol", auto_snow_loop.DEFAULT_BRIGHT_TOL)),
+        float(auto.get("dark_tol", auto_snow_loop.DEFAULT_DARK_TOL)),
+        int(auto.get("bg_border", auto_snow_loop.DEFAULT_BG_BORDER)),
+        int(auto.get("bg_max_mean", auto_snow_loop.DEFAULT_BG_MAX_MEAN)),
+    )
+    pool = auto_snow_loop.BufferPool(WIDTH, HEIGHT)
+    prefilter = auto_snow_loop.MatchPrefilter(audit_rate=0.0)  # audits would add random full matches
+    half = det["color_box"] // 2
+
+    def iteration():
+        frame_bgr, frame_gray = pool.grab(screen, monitor)
+        for tset in buttons:
+            tset.match(frame_gray, 0.75, *match_args, prefilter=prefilter, pool=pool)
+        for (x, y) in points[:20]:
+            auto_snow_loop.color_hit(frame_bgr[y - half:y + half, x - half:x + half], config, pool)
+
+    iteration()  # first pass allocates the pool buffers
+    iteration()
+
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        for _ in range(5):
+            iteration()
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert peak < MAX_PEAK_BYTES, f"steady-state peak {peak / 1024:.0f} KB"